@@ -16,16 +16,27 @@ def runtests(args=None):
     from django.test.utils import get_runner
     from django.conf import settings
 
+    if os.getenv('DATABASE_NAME'):
+        # Cloning tenant schemas is only tested on PostgreSQL
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DATABASE_NAME'),
+            'USER': os.getenv('DATABASE_USER', ''),
+            'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+            'HOST': os.getenv('DATABASE_HOST', ''),
+            'PORT': os.getenv('DATABASE_PORT', ''),
+        }
+    else:
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(TOP_DIR, 'db.sqlite3')
+        }
+
     if not settings.configured:
         settings.configure(
             # The PROJECT_ROOT needs to be inside the package to load locale
             PROJECT_ROOT=os.path.abspath(BASE_DIR),
-            DATABASES={
-                'default': {
-                    'ENGINE': 'django.db.backends.sqlite3',
-                    'NAME': os.path.join(TOP_DIR, 'db.sqlite3')
-                }
-            },
+            DATABASES={'default': database},
             INSTALLED_APPS=[
                 'django.contrib.contenttypes',
                 'django.contrib.sites',
@@ -25,6 +25,9 @@ setup(
         'python-memcached>=1.53',
         'pymemcache==4.0.0',
     ],
+    extras_require={
+        'transifex': ['transifex-client==0.12.5'],
+    },
     tests_require=[
         'munch',
         'django-nose>=1.4.4',
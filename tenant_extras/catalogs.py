@@ -0,0 +1,184 @@
+"""
+Compact on-disk translation catalogs that are memory mapped, so all worker
+processes share one copy in the page cache.
+
+The file starts with a header, followed by an open addressing hash table
+of slots and the UTF-8 encoded keys, values and JSON metadata:
+
+    header: magic, count, slots, meta offset, meta length
+    slot:   crc32 of key, key offset, key length, value offset, value length
+
+Plural keys (msgid, index) are stored as msgid + NUL + index.
+"""
+import gettext as gettext_module
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+MAGIC = b'TXC1'
+HEADER = struct.Struct('<4sIIII')
+SLOT = struct.Struct('<IIIII')
+
+
+def _encode_key(key):
+    if isinstance(key, tuple):
+        return u'{0}\x00{1}'.format(*key).encode('utf-8')
+    return key.encode('utf-8')
+
+
+def _decode_key(data):
+    key = data.decode('utf-8')
+    if '\x00' in key:
+        msgid, index = key.split('\x00')
+        return (msgid, int(index))
+    return key
+
+
+def _plural_function(plural_forms):
+    """
+    Returns the plural function for a Plural-Forms header, like gettext.
+    """
+    if plural_forms and 'plural=' in plural_forms:
+        return gettext_module.c2py(plural_forms.split('plural=')[1].strip().rstrip(';'))
+    return lambda n: int(n != 1)
+
+
+def write_catalog(path, items, plural_forms=None, meta=None):
+    """
+    Writes the (key, value) items to a catalog file. The file is replaced
+    atomically, so other processes never map a partial file.
+    """
+    entries = [(_encode_key(key), value.encode('utf-8')) for key, value in items]
+
+    slots = 1
+    while slots < len(entries) * 2:
+        slots *= 2
+
+    meta = dict(meta or {}, plural_forms=plural_forms)
+    meta_data = json.dumps(meta).encode('utf-8')
+
+    table = [None] * slots
+    data = bytearray()
+    offset = HEADER.size + slots * SLOT.size
+
+    for key, value in entries:
+        key_hash = zlib.crc32(key) & 0xffffffff
+        index = key_hash & (slots - 1)
+        while table[index] is not None:
+            index = (index + 1) & (slots - 1)
+
+        key_offset = offset + len(data)
+        data += key
+        value_offset = offset + len(data)
+        data += value
+        table[index] = (key_hash, key_offset, len(key), value_offset, len(value))
+
+    meta_offset = offset + len(data)
+    data += meta_data
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(entries), slots, meta_offset, len(meta_data)))
+            for slot in table:
+                f.write(SLOT.pack(*(slot or (0, 0, 0, 0, 0))))
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_catalog(path):
+    """
+    Maps a catalog file and returns it as a MappedCatalog.
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return MappedCatalog(buffer)
+
+
+class MappedCatalog(object):
+    """
+    A read-only catalog on a memory mapped catalog file. It has the same
+    lookup methods as the catalogs of Django's DjangoTranslation.
+    """
+    def __init__(self, buffer):
+        try:
+            magic, self.count, self.slots, meta_offset, meta_length = HEADER.unpack_from(buffer, 0)
+        except struct.error:
+            raise ValueError('Not a translation catalog')
+        if magic != MAGIC:
+            raise ValueError('Not a translation catalog')
+        # A truncated file would fail on the lookups instead
+        if (len(buffer) < HEADER.size + self.slots * SLOT.size or
+                len(buffer) < meta_offset + meta_length):
+            raise ValueError('Truncated translation catalog')
+
+        self._buffer = buffer
+        self.meta = json.loads(buffer[meta_offset:meta_offset + meta_length].decode('utf-8'))
+        self.plural_forms = self.meta.get('plural_forms')
+        self.plural_function = _plural_function(self.plural_forms)
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, index):
+        return SLOT.unpack_from(self._buffer, HEADER.size + index * SLOT.size)
+
+    def _find(self, key):
+        try:
+            key = _encode_key(key)
+        except (AttributeError, TypeError):
+            return None
+
+        key_hash = zlib.crc32(key) & 0xffffffff
+        index = key_hash & (self.slots - 1)
+        while True:
+            slot_hash, key_offset, key_length, value_offset, value_length = self._slot(index)
+            if value_offset == 0:
+                return None
+            if slot_hash == key_hash and self._buffer[key_offset:key_offset + key_length] == key:
+                return self._buffer[value_offset:value_offset + value_length].decode('utf-8')
+            index = (index + 1) & (self.slots - 1)
+
+    def __getitem__(self, key):
+        value = self._find(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def get(self, key, default=None):
+        value = self._find(key)
+        if value is None:
+            return default
+        return value
+
+    def items(self):
+        for index in range(self.slots):
+            slot_hash, key_offset, key_length, value_offset, value_length = self._slot(index)
+            if value_offset:
+                yield (
+                    _decode_key(self._buffer[key_offset:key_offset + key_length]),
+                    self._buffer[value_offset:value_offset + value_length].decode('utf-8')
+                )
+
+    def keys(self):
+        for key, value in self.items():
+            yield key
+
+    def plural(self, msgid, num):
+        value = self._find((msgid, self.plural_function(num)))
+        if value is None:
+            raise KeyError(msgid)
+        return value
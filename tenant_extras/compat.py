@@ -5,3 +5,9 @@ except ImportError:
 
     def is_language_prefix_patterns_used(urlconf):
         LocaleMiddleware().is_language_prefix_patterns_used
+
+try:
+    from django.utils.translation.trans_real import TranslationCatalog
+except ImportError:
+    # Before Django 2.2 the catalogs of a translation are merged into a dict
+    TranslationCatalog = dict
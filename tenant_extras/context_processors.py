@@ -1,9 +1,20 @@
+import hashlib
 import json
 import re
 
+from django.core.signals import setting_changed
 from django.db import connection
 from django.conf import settings
-from .utils import get_tenant_properties
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+from .lru import LRUCache
+from .utils import get_tenant_properties, get_tenant_properties_version
+
+# Serialized settings per (tenant, language, properties version, exposed properties),
+# bounded by TENANT_SETTINGS_CACHE_SIZE entries, 1024 by default
+_settings_cache = LRUCache(maxsize=getattr(settings, 'TENANT_SETTINGS_CACHE_SIZE', 1024))
+_camelcase = {}
 
 def conf_settings(request):
     """
@@ -36,13 +47,27 @@ def tenant_properties(request):
         This adds the value of the keys MIXPANEL and ANALYTICS from the settings file to the context. 
 
         The values are also added to a 'settings' JSON key so a JS object can be generated from the context.
+        The result is cached per tenant, language and properties version, so the JSON is
+        serialized once per cached entry. 'settings_version' changes with the JSON, use it to
+        version the URL of the tenant_extras.views.tenant_settings view; it is only computed
+        once a template reads it.
 
     """ 
-    from .utils import get_tenant_properties
-    from django.conf import settings
+    cached = get_tenant_settings(request)
+    if cached is None:
+        return {}
+
+    context = dict(cached.context)
+    context['settings'] = cached.json()
+    context['settings_version'] = SimpleLazyObject(cached.version)
+    return context
 
-    context = {}
 
+def get_tenant_settings(request):
+    """
+    Returns the TenantSettings for the tenant and language of the request,
+    or None if no properties are exposed.
+    """
     properties = get_tenant_properties()
 
     props = None
@@ -56,13 +81,79 @@ def tenant_properties(request):
         try:
             props = getattr(settings, 'EXPOSED_TENANT_PROPERTIES')
         except AttributeError:
-            return context
+            return None
+
+    if connection.tenant:
+        tenant_name = connection.tenant.client_name
+    else:
+        tenant_name = None
+
+    key = (
+        tenant_name,
+        getattr(request, 'LANGUAGE_CODE', ''),
+        get_tenant_properties_version(tenant_name),
+        tuple(props)
+    )
+    cached = _settings_cache.get(key)
+    if cached is None:
+        cached = _tenant_properties(request, properties, props)
+        _settings_cache.set(key, cached)
+
+    return cached
+
+
+class TenantSettings(object):
+    """
+    The exposed properties of a tenant and the settings that are serialized
+    to JSON for the frontend.
+    """
+    def __init__(self, context, settings):
+        self.context = context
+        self.settings = settings
+        self._json = None
+        self._version = None
+
+    def json(self):
+        if self._json is None:
+            self._json = json.dumps(self.settings)
+        return self._json
+
+    def version(self):
+        """
+        Returns a hash of the JSON, it is the same in every worker.
+        """
+        if self._version is None:
+            self._version = hashlib.md5(self.json().encode('utf-8')).hexdigest()
+        return self._version
+
+
+def _camelcase_keys(props):
+    """
+    Returns (property, setting, camelcase key) for the exposed properties.
+    """
+    key = tuple(props)
+    try:
+        return _camelcase[key]
+    except KeyError:
+        # Use camelcase for setting keys (convert from snakecase)
+        keys = [
+            (item, item.upper(), re.sub('_.', lambda x: x.group()[1].upper(), item))
+            for item in props
+        ]
+        _camelcase[key] = keys
+        return keys
+
+
+def _tenant_properties(request, properties, props):
+    """
+    Returns the exposed properties and settings of the current tenant.
+    """
+    context = {}
 
     # First load tenant settings that should always be exposed
     if connection.tenant:
         current_tenant = connection.tenant
-        properties = get_tenant_properties()
-        context['settings'] =  {
+        settings = {
             'mapsApiKey': getattr(properties, 'MAPS_API_KEY', ''),
             'donationsEnabled': getattr(properties, 'DONATIONS_ENABLED', True),
             'recurringDonationsEnabled': getattr(properties, 'RECURRING_DONATIONS_ENABLED', False),
@@ -71,18 +162,23 @@ def tenant_properties(request):
             'languages': [{'code': lang[0], 'name': lang[1]} for lang in getattr(properties, 'LANGUAGES')]
          }
     else:
-        context['settings'] = {}
+        settings = {}
 
     # Now load the tenant specific properties
-    for item in props:
+    for item, name, key in _camelcase_keys(props):
         try:
-            context[item.upper()] = getattr(properties, item.upper())
-            # Use camelcase for setting keys (convert from snakecase)
-            key = re.sub('_.',lambda x: x.group()[1].upper(), item)
-            context['settings'][key] = getattr(properties, item.upper())
+            context[name] = getattr(properties, name)
+            settings[key] = context[name]
         except AttributeError:
             pass
 
-    context['settings'] = json.dumps(context['settings'])
-    return context
+    return TenantSettings(context, settings)
+
 
+@receiver(setting_changed)
+def clear_settings_cache(**kwargs):
+    # Exposed properties can fall through to settings
+    _settings_cache.clear()
+    _camelcase.clear()
+    if kwargs['setting'] == 'TENANT_SETTINGS_CACHE_SIZE':
+        _settings_cache.resize(maxsize=getattr(settings, 'TENANT_SETTINGS_CACHE_SIZE', 1024))
@@ -0,0 +1,150 @@
+"""
+Generation stamps for invalidating in-process tenant caches across workers.
+
+Configure a backend with the TENANT_GENERATIONS setting:
+
+TENANT_GENERATIONS = {
+    'BACKEND': 'tenant_extras.generations.CacheGenerationBackend',
+    'INTERVAL': 5,
+    'OPTIONS': {'alias': 'default'},
+}
+
+Workers look up the stamp of a tenant at most once every INTERVAL seconds.
+When it differs from the one seen before, `tenant_changed` is sent and the
+receivers drop whatever they cached for that tenant.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import Signal, receiver
+from django.utils.module_loading import import_string
+
+tenant_changed = Signal()
+
+_unset = object()
+_backend = _unset
+_seen = {}
+_checked = {}
+
+
+class CacheGenerationBackend(object):
+    """
+    Keeps the generation stamps in a Django cache shared by all workers.
+
+    Use a cache that is not tenant aware, the stamps are keyed by tenant.
+    """
+    def __init__(self, alias='default', key_prefix='tenant-generation'):
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def make_key(self, tenant_name):
+        return '{0}:{1}'.format(self.key_prefix, tenant_name)
+
+    def get(self, tenant_name):
+        return self.cache.get(self.make_key(tenant_name), 0)
+
+    def bump(self, tenant_name):
+        key = self.make_key(tenant_name)
+        self.cache.add(key, 0, None)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # The key was evicted in between
+            self.cache.set(key, 1, None)
+            return 1
+
+
+class FileGenerationBackend(object):
+    """
+    Uses the mtime of a stamp file in MULTI_TENANT_DIR/<tenant>/ as
+    generation, for nodes that share the tenant directory.
+    """
+    def __init__(self, filename='.generation'):
+        self.filename = filename
+
+    def path(self, tenant_name):
+        return os.path.join(settings.MULTI_TENANT_DIR, tenant_name, self.filename)
+
+    def get(self, tenant_name):
+        try:
+            return os.stat(self.path(tenant_name)).st_mtime_ns
+        except OSError:
+            return 0
+
+    def bump(self, tenant_name):
+        path = self.path(tenant_name)
+        with open(path, 'w') as stamp:
+            stamp.write(str(time.time()))
+        return self.get(tenant_name)
+
+
+def get_generation_backend():
+    """
+    Returns the configured generation backend, or None if there is none.
+    """
+    global _backend
+
+    if _backend is _unset:
+        config = getattr(settings, 'TENANT_GENERATIONS', None)
+        if config:
+            backend_class = import_string(config['BACKEND'])
+            _backend = backend_class(**config.get('OPTIONS', {}))
+        else:
+            _backend = None
+
+    return _backend
+
+
+def check_tenant_generation(tenant_name):
+    """
+    Sends `tenant_changed` if the generation of the tenant changed since it
+    was last checked. The backend is asked at most once per interval.
+    """
+    if tenant_name is None:
+        return
+
+    backend = get_generation_backend()
+    if backend is None:
+        return
+
+    now = time.monotonic()
+    last_checked = _checked.get(tenant_name)
+    interval = settings.TENANT_GENERATIONS.get('INTERVAL', 5)
+    if last_checked is not None and now - last_checked < interval:
+        return
+    _checked[tenant_name] = now
+
+    generation = backend.get(tenant_name)
+    seen = _seen.get(tenant_name)
+    _seen[tenant_name] = generation
+
+    if seen is not None and seen != generation:
+        tenant_changed.send(sender=backend.__class__, tenant_name=tenant_name)
+
+
+def bump_tenant_generation(tenant_name):
+    """
+    Marks the tenant as changed for all workers. The caches of the current
+    process are invalidated right away.
+    """
+    backend = get_generation_backend()
+    if backend is not None:
+        _seen[tenant_name] = backend.bump(tenant_name)
+        sender = backend.__class__
+    else:
+        sender = None
+
+    tenant_changed.send(sender=sender, tenant_name=tenant_name)
+
+
+@receiver(setting_changed)
+def clear_generation_backend(**kwargs):
+    global _backend
+
+    if kwargs['setting'] == 'TENANT_GENERATIONS':
+        _backend = _unset
+        _seen.clear()
+        _checked.clear()
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache(object):
+    """
+    A mapping bounded by number of entries and/or total weight, that drops
+    the least recently used entries first.
+
+    Lookups don't take the lock, only writes and evictions do. The hit and
+    miss counters are therefore approximate under concurrent use.
+    """
+    def __init__(self, maxsize=128, maxweight=None, weigher=None):
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weigher = weigher
+
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._data = OrderedDict()
+        self._weights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+            self._data.move_to_end(key)
+        except KeyError:
+            # Missing, or evicted by another thread in between
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        weight = self.weigher(value) if self.weigher else 0
+
+        with self._lock:
+            self.weight -= self._weights.pop(key, 0)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._weights[key] = weight
+            self.weight += weight
+            self._trim()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self.weight -= self._weights.pop(key, 0)
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+
+    def resize(self, maxsize=None, maxweight=None):
+        with self._lock:
+            self.maxsize = maxsize
+            self.maxweight = maxweight
+            self._trim()
+
+    def stats(self):
+        return {
+            'entries': len(self._data),
+            'weight': self.weight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _full(self):
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            return True
+        return self.maxweight is not None and self.weight > self.maxweight
+
+    def _trim(self):
+        # Always keep the most recent entry, even if it is too heavy by itself
+        while len(self._data) > 1 and self._full():
+            key, _ = self._data.popitem(last=False)
+            self.weight -= self._weights.pop(key, 0)
+            self.evictions += 1
@@ -1,12 +1,21 @@
 from __future__ import unicode_literals
 
 import codecs
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from optparse import make_option
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.core.management.utils import find_command, popen_wrapper
+from django.db import DatabaseError, connection
+from django.utils.translation import to_language
+
+from tenant_extras.pocompiler import PoFileError, compile_file
+from tenant_extras.utils import activate_tenant, get_cache_path, get_tenant_names
 
 
 class Command(BaseCommand):
@@ -26,20 +35,39 @@ class Command(BaseCommand):
                             help='locale(s) to process (e.g. de_AT). Default is to process all. Can be used multiple times.'),
         parser.add_argument('--tenant', dest='tenant', default=None,
                             help="Compile .po files for tenant."),
+        parser.add_argument('--jobs', '-j', dest='jobs', type=int, default=1,
+                            help="Number of .po files to compile at the same time."),
+        parser.add_argument('--incremental', '-i', dest='incremental', action='store_true', default=False,
+                            help="Skip .po files that are unchanged since they were last compiled."),
+        parser.add_argument('--backend', dest='backend', choices=['msgfmt', 'python'], default='msgfmt',
+                            help="Compile with GNU msgfmt or in-process with the Python compiler."),
+        parser.add_argument('--merge', dest='merge', action='store_true', default=False,
+                            help="Also write a pre-merged catalog per tenant and language."),
 
     def handle(self, **options):
         locale = options.get('locale')
         tenant = options.get('tenant')
-        compile_messages(self.stdout, locale=locale, tenant=tenant)
+        compile_messages(self.stdout, locale=locale, tenant=tenant,
+                         jobs=options.get('jobs'), incremental=options.get('incremental'),
+                         backend=options.get('backend'))
+
+        if options.get('merge'):
+            merge_catalogs(self.stdout, locale=locale, tenant=tenant)
 
 
-def compile_messages(stdout, locale=None, tenant=None):
+def compile_messages(stdout, locale=None, tenant=None, jobs=1, incremental=False, backend='msgfmt'):
     """
     Standard compile_messages updated to handle compiling po files for
     multiple tenants if MULTI_TENANT_DIR settings defined.
+
+    With `incremental` .po files whose .mo file is up to date are skipped.
+    The 'python' backend compiles in-process instead of running msgfmt.
     """
-    program = 'msgfmt'
-    if find_command(program) is None:
+    if backend == 'python':
+        program = 'pocompiler'
+    else:
+        program = 'msgfmt'
+    if backend != 'python' and find_command(program) is None:
         raise CommandError("Can't find %s. Make sure you have GNU gettext tools 0.15 or newer installed." % program)
 
     basedirs = [os.path.join('conf', 'locale'), 'locale']
@@ -61,11 +89,21 @@ def compile_messages(stdout, locale=None, tenant=None):
     if not basedirs:
         raise CommandError("This script should be run from the Django Git checkout or your project or app tree, or with the settings module specified.")
 
+    files = []
     for basedir in basedirs:
-        _compile(stdout, locale, basedir, program)
+        files.extend(_find_po_files(locale, basedir))
+
+    start = time.time()
+    compiled, skipped, failed, seconds = _compile(stdout, files, program, jobs, incremental, backend)
+
+    stdout.write('compiled %d, skipped %d, failed %d files in %.2fs (%s %.2fs)\n' % (
+        compiled, skipped, len(failed), time.time() - start, program, seconds))
 
+    if failed:
+        raise CommandError('\n'.join(failed))
 
-def _compile(stdout, locale, basedir, program):
+
+def _find_po_files(locale, basedir):
     if locale:
         dirs = [os.path.join(basedir, l, 'LC_MESSAGES') for l in locale]
     else:
@@ -73,16 +111,175 @@ def _compile(stdout, locale, basedir, program):
     for ldir in dirs:
         for dirpath, dirnames, filenames in os.walk(ldir):
             for f in filenames:
-                if not f.endswith('.po'):
-                    continue
-                stdout.write('processing file %s in %s\n' % (f, dirpath))
-                fn = os.path.join(dirpath, f)
-                pf = os.path.splitext(fn)[0]
-                args = [program, '--check-format', '-o', pf + '.mo', pf + '.po']
-                output, errors, status = popen_wrapper(args)
-                if status:
-                    if errors:
-                        msg = "Execution of %s failed: %s" % (program, errors)
-                    else:
-                        msg = "Execution of %s failed" % program
-                    raise CommandError(msg)
+                if f.endswith('.po'):
+                    yield basedir, os.path.join(dirpath, f)
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _hashes_path(basedir):
+    # Hashes of the .po files as they were last compiled
+    return get_cache_path('compilepo', basedir)
+
+
+def _load_hashes(basedir):
+    try:
+        with open(_hashes_path(basedir)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _save_hashes(basedir, hashes):
+    path = _hashes_path(basedir)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
+
+
+def _is_current(po_file, mo_file, po_hash):
+    """
+    A .mo file is current if it is newer than the .po file, or if the .po
+    file has the same content as when it was last compiled.
+    """
+    try:
+        if os.stat(mo_file).st_mtime >= os.stat(po_file).st_mtime:
+            return True
+    except OSError:
+        return False
+    return po_hash is not None and po_hash == _file_hash(po_file)
+
+
+def _run_msgfmt(program, po_file, mo_file):
+    start = time.time()
+    args = [program, '--check-format', '-o', mo_file, po_file]
+    output, errors, status = popen_wrapper(args)
+    return status, errors, time.time() - start
+
+
+def _run_python(program, po_file, mo_file):
+    start = time.time()
+    try:
+        compile_file(po_file, mo_file)
+    except (PoFileError, IOError, OSError, LookupError, UnicodeError) as e:
+        return 1, str(e), time.time() - start
+    return 0, '', time.time() - start
+
+
+def _compile(stdout, files, program, jobs=1, incremental=False, backend='msgfmt'):
+    """
+    Compiles the .po files with up to `jobs` msgfmt processes at a time, or
+    with the Python compiler in batches over `jobs` processes. Returns the
+    compiled and skipped counts, the errors and the time spent compiling.
+    """
+    hashes = {}
+    for basedir, po_file in files:
+        if basedir not in hashes:
+            hashes[basedir] = _load_hashes(basedir) if incremental else {}
+
+    skipped = 0
+    tasks = []
+    for basedir, po_file in files:
+        mo_file = os.path.splitext(po_file)[0] + '.mo'
+        key = os.path.relpath(po_file, basedir)
+        if incremental and _is_current(po_file, mo_file, hashes[basedir].get(key)):
+            skipped += 1
+            continue
+        tasks.append((basedir, key, po_file, mo_file))
+
+    compiled = 0
+    failed = []
+    seconds = 0
+
+    jobs = max(jobs, 1)
+    if backend == 'python':
+        run = _run_python
+        # Compiling is CPU bound, so it needs processes to run in parallel
+        executor_class = ProcessPoolExecutor if jobs > 1 else ThreadPoolExecutor
+    else:
+        run = _run_msgfmt
+        executor_class = ThreadPoolExecutor
+
+    with executor_class(max_workers=jobs) as executor:
+        results = executor.map(
+            run,
+            [program] * len(tasks),
+            [task[2] for task in tasks],
+            [task[3] for task in tasks],
+            chunksize=max(len(tasks) // (jobs * 4), 1)
+        )
+        for (basedir, key, po_file, mo_file), (status, errors, elapsed) in zip(tasks, results):
+            stdout.write('processing file %s in %s\n' % (
+                os.path.basename(po_file), os.path.dirname(po_file)))
+
+            seconds += elapsed
+            if status:
+                if errors:
+                    failed.append("Execution of %s failed for %s: %s" % (program, po_file, errors))
+                else:
+                    failed.append("Execution of %s failed for %s" % (program, po_file))
+                hashes[basedir].pop(key, None)
+            else:
+                compiled += 1
+                if incremental:
+                    hashes[basedir][key] = _file_hash(po_file)
+
+    if incremental:
+        for basedir, basedir_hashes in hashes.items():
+            _save_hashes(basedir, basedir_hashes)
+
+    return compiled, skipped, failed, seconds
+
+
+def merge_catalogs(stdout, locale=None, tenant=None):
+    """
+    Writes one catalog file per tenant and language with the tenant, global
+    and fallback language catalogs merged, so workers load a single file.
+    """
+    from tenant_extras.middleware import write_merged_catalog
+    from tenant_schemas.utils import get_tenant_model
+
+    tenant_names = [tenant] if tenant else get_tenant_names()
+
+    if locale:
+        languages = [to_language(l) for l in locale]
+    else:
+        languages = [code for code, name in settings.LANGUAGES]
+
+    # Activate tenants that exist, so they fall back to their own language
+    try:
+        tenants = dict(
+            (t.client_name, t)
+            for t in get_tenant_model().objects.filter(client_name__in=tenant_names)
+        )
+    except DatabaseError:
+        stdout.write('Could not load tenants, using the active properties for the fallback language\n')
+        tenants = {}
+
+    # Tenants without a row use the properties that are active before any
+    # tenant is activated, so they are merged first
+    for tenant_name in tenant_names:
+        if tenants and tenant_name not in tenants:
+            stdout.write('No tenant found for %s, using the active properties for the fallback language\n'
+                         % tenant_name)
+    tenant_names = sorted(tenant_names, key=lambda tenant_name: tenant_name in tenants)
+
+    try:
+        for tenant_name in tenant_names:
+            if tenant_name in tenants:
+                activate_tenant(tenants[tenant_name])
+
+            for language in languages:
+                path = write_merged_catalog(language, tenant_name)
+                if path is None:
+                    stdout.write('skipped catalog of %s for %s, the plural forms differ\n'
+                                 % (tenant_name, language))
+                else:
+                    stdout.write('merged catalog %s\n' % path)
+    finally:
+        if tenants:
+            connection.set_schema_to_public()
@@ -1,13 +1,25 @@
-from optparse import make_option
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 from django.core import exceptions
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils.encoding import force_str
-from django.utils.six.moves import input
+from tenant_schemas.models import TenantMixin
+from tenant_schemas.signals import post_schema_sync
 from tenant_schemas.utils import get_tenant_model
 from django.conf import settings
+from django.db import connection, connections, transaction
 from django.db.utils import IntegrityError
 from django.core.management import call_command
 
+from tenant_extras.schemas import TemplateSchemaError, check_template_schema, clone_schema
+
+FIXTURES = ['skills', 'redirects', 'project_data', 'geo_data']
+
 
 class Command(BaseCommand):
     help = 'Create a tenant'
@@ -18,6 +30,13 @@ class Command(BaseCommand):
         parser.add_argument('--domain-url', help='Specifies the domain_url for the tenant (e.g. "new-tenant.localhost").'),
         parser.add_argument('--client-name', help='Specifies the client name for the tenant (e.g. "new-tenant").'),
         parser.add_argument('--post-command', help='Calls another management command after the tenant is created.')
+        parser.add_argument('--from-file', help='Creates the tenants in a CSV or JSON file, with a full_name and '
+                                                'optionally client_name, schema_name and domain_url per tenant.')
+        parser.add_argument('--jobs', '-j', type=int, default=4,
+                            help='Number of tenants to create at the same time with --from-file.')
+        parser.add_argument('--template-schema', default=getattr(settings, 'TENANT_TEMPLATE_SCHEMA', None),
+                            help='Creates the schema as a copy of this migrated schema with the fixtures '
+                                 'loaded, instead of migrating it and loading the fixtures.')
 
     def handle(self, *args, **options):
         name = options.get('full_name', None)
@@ -26,15 +45,21 @@ class Command(BaseCommand):
         domain_url = options.get('domain_url', None)
         post_command = options.get('post_command', None)
 
+        self.template_schema = options.get('template_schema')
+        if self.template_schema:
+            try:
+                check_template_schema(self.template_schema)
+            except TemplateSchemaError as e:
+                raise CommandError(str(e))
+
+        if options.get('from_file'):
+            if post_command:
+                raise CommandError("The --post-command option can't be used with --from-file.")
+            return self.create_from_file(options['from_file'], jobs=options.get('jobs') or 1)
+
         # If full-name is specified then don't prompt for any values.
         if name:
-            if not client_name:
-                client_name=''.join(ch  if ch.isalnum() else '-' for ch in name).lower()
-            if not schema_name:
-                schema_name=client_name.replace('-', '_')
-            if not domain_url:
-                base_domain = getattr(settings, 'TENANT_BASE_DOMAIN', 'localhost')
-                domain_url='{0}.{1}'.format(client_name, base_domain)
+            client_name, schema_name, domain_url = tenant_defaults(name, client_name, schema_name, domain_url)
 
             client = self.store_client(
                 name=name,
@@ -50,10 +75,7 @@ class Command(BaseCommand):
                 input_msg = 'Tenant name'
                 name = input(force_str('%s: ' % input_msg))
 
-            default_client_name=''.join(ch  if ch.isalnum() else '-' for ch in name).lower()
-            default_schema_name=default_client_name.replace('-', '_')
-            base_domain = getattr(settings, 'TENANT_BASE_DOMAIN', 'localhost')
-            default_domain_url='{0}.{1}'.format(default_client_name, base_domain)
+            default_client_name, default_schema_name, default_domain_url = tenant_defaults(name)
 
             while client_name is None:
                 if not client_name:
@@ -86,35 +108,57 @@ class Command(BaseCommand):
                 name = None
                 continue
 
-        if client and client_name:
+        if client and client_name and not self.template_schema:
             self.load_fixtures(client_name=client_name)
 
         if client and post_command:
             call_command(post_command, *args, **options)
 
-    def load_fixtures(self, client_name):
-        from django.db import connection
+    def create_from_file(self, path, jobs=1):
+        """
+        Creates the tenants in a CSV or JSON file, up to `jobs` at a time in
+        worker processes. All rows are validated before any tenant is created.
+        """
+        rows = validate_tenants(read_tenants(path))
+        template_schemas = [self.template_schema] * len(rows)
+
+        start = time.time()
+        if jobs > 1:
+            # Migrating and loading fixtures is not thread safe, so every
+            # tenant is created in a forked process with its own connection
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork'))
+            with executor:
+                results = list(executor.map(_create_tenant, rows, template_schemas))
+        else:
+            results = [_create_tenant(row, self.template_schema) for row in rows]
+
+        failed = []
+        for row, (error, seconds) in zip(rows, results):
+            if error:
+                failed.append(row['client_name'])
+                self.stderr.write('Failed to create {} in {:.2f}s: {}'.format(row['client_name'], seconds, error))
+            else:
+                self.stdout.write('Created {} in {:.2f}s'.format(row['client_name'], seconds))
+
+        self.stdout.write('Created {} of {} tenants in {:.2f}s'.format(
+            len(rows) - len(failed), len(rows), time.time() - start))
 
+        if failed:
+            raise CommandError('Creating tenants failed for {}'.format(', '.join(failed)))
+
+    def load_fixtures(self, client_name):
         try:
             tenant = get_tenant_model().objects.get(client_name=client_name)
             connection.set_tenant(tenant)
-            call_command('loaddata', 'skills')
-            call_command('loaddata', 'redirects')
-            call_command('loaddata', 'project_data')
-            call_command('loaddata', 'geo_data')
+            call_command('loaddata', *FIXTURES)
         except get_tenant_model().DoesNotExist:
             self.stdout.write("Client not found. Skipping loading fixtures")
 
     def store_client(self, name, client_name, domain_url, schema_name):
         try:
-            client = get_tenant_model().objects.create(
-                name=name,
-                client_name=client_name,
-                domain_url=domain_url.split(":", 1)[0],  # strip optional port
-                schema_name=schema_name
-            )
-            client.save()
-            return client
+            return create_client(name, client_name, domain_url, schema_name,
+                                 template_schema=getattr(self, 'template_schema', None))
         except exceptions.ValidationError as e:
             self.stderr.write("Error: %s" % '; '.join(e.messages))
             name = None
@@ -122,3 +166,128 @@ class Command(BaseCommand):
         except IntegrityError as e:
             self.stderr.write("Error: We've already got a tenant with that name or property.")
             return False
+
+
+def tenant_defaults(name, client_name=None, schema_name=None, domain_url=None):
+    """
+    Returns the client name, schema name and domain url for a tenant name,
+    deriving the ones that are not given from the name.
+    """
+    if not client_name:
+        client_name = ''.join(ch if ch.isalnum() else '-' for ch in name).lower()
+    if not schema_name:
+        schema_name = client_name.replace('-', '_')
+    if not domain_url:
+        base_domain = getattr(settings, 'TENANT_BASE_DOMAIN', 'localhost')
+        domain_url = '{0}.{1}'.format(client_name, base_domain)
+    return client_name, schema_name, domain_url
+
+
+def create_client(name, client_name, domain_url, schema_name, template_schema=None):
+    """
+    Creates a tenant. With a template schema, the tenant's schema is created
+    as a copy of it instead of by running the migrations.
+    """
+    if not template_schema:
+        client = get_tenant_model().objects.create(
+            name=name,
+            client_name=client_name,
+            domain_url=domain_url.split(":", 1)[0],  # strip optional port
+            schema_name=schema_name
+        )
+        client.save()
+        return client
+
+    with transaction.atomic():
+        clone_schema(template_schema, schema_name)
+        client = get_tenant_model()(
+            name=name,
+            client_name=client_name,
+            domain_url=domain_url.split(":", 1)[0],  # strip optional port
+            schema_name=schema_name
+        )
+        client.auto_create_schema = False
+        client.save()
+
+    post_schema_sync.send(sender=TenantMixin, tenant=client)
+    return client
+
+
+def _create_tenant(row, template_schema=None):
+    """
+    Creates a tenant and loads its fixtures, returning the error if that
+    failed and the time it took.
+    """
+    start = time.time()
+    try:
+        client = create_client(template_schema=template_schema, **row)
+        if not template_schema:
+            connection.set_tenant(client)
+            call_command('loaddata', *FIXTURES)
+    except Exception as e:
+        return str(e) or e.__class__.__name__, time.time() - start
+    finally:
+        connection.set_schema_to_public()
+    return None, time.time() - start
+
+
+def read_tenants(path):
+    """
+    Returns the rows of a CSV file with a header, or of a JSON list.
+    """
+    try:
+        with open(path) as f:
+            if os.path.splitext(path)[1].lower() == '.json':
+                rows = json.load(f)
+            else:
+                rows = list(csv.DictReader(f))
+    except (IOError, OSError, ValueError) as e:
+        raise CommandError('Could not read {}: {}'.format(path, e))
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise CommandError('{} should contain a list of tenants'.format(path))
+    return rows
+
+
+def validate_tenants(rows):
+    """
+    Returns the rows with defaults filled in, or raises a CommandError with
+    the errors of all rows.
+    """
+    tenants = []
+    errors = []
+    seen = {}
+
+    for number, row in enumerate(rows, 1):
+        name = (row.get('full_name') or row.get('name') or '').strip()
+        if not name:
+            errors.append('Row {}: full_name is required'.format(number))
+            continue
+
+        client_name, schema_name, domain_url = tenant_defaults(
+            name, row.get('client_name'), row.get('schema_name'), row.get('domain_url')
+        )
+        tenant = dict(
+            name=name,
+            client_name=client_name,
+            schema_name=schema_name,
+            domain_url=domain_url.split(":", 1)[0],
+        )
+
+        for field in ('client_name', 'schema_name', 'domain_url'):
+            key = (field, tenant[field])
+            if key in seen:
+                errors.append('Row {}: {} {} is also used in row {}'.format(
+                    number, field, tenant[field], seen[key]))
+            seen.setdefault(key, number)
+
+        try:
+            get_tenant_model()(**tenant).full_clean()
+        except exceptions.ValidationError as e:
+            errors.append('Row {}: {}'.format(number, '; '.join(e.messages)))
+
+        tenants.append(tenant)
+
+    if errors:
+        raise CommandError('\n'.join(errors))
+    return tenants
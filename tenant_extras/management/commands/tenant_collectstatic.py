@@ -1,52 +1,293 @@
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from django.utils.datastructures import SortedDict
-from django.contrib.staticfiles import finders, storage
+from django.contrib.staticfiles import finders
 from django.conf import settings
-from django.db import connection
+from django.core.management.base import CommandError
 
 from django.contrib.staticfiles.management.commands.collectstatic import (Command as BaseCommand)
 
 from tenant_extras.staticfiles_finders import TenantStaticFilesFinder
-from tenant_schemas.utils import get_public_schema_name, get_tenant_model
+
+# Size, modification time and hash of the tenant files as last collected
+MANIFEST_FILE = '.collectstatic-manifest.json'
+
+# Directory in the destination with one copy of each distinct tenant file
+BLOBS_DIR = '.blobs'
 
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--jobs', '-j', dest='jobs', type=int, default=1,
+                            help='Number of files to copy or link at the same time.')
+        parser.add_argument('--tenant', '-t', dest='tenant', default=None,
+                            help='Only collect the static files of this tenant. Skips post processing.')
+        parser.add_argument('--dedup', dest='dedup', nargs='?', const='hardlink', choices=['hardlink', 'symlink'],
+                            help='Store identical tenant files once and hardlink (default) or symlink them.')
+
+    def set_options(self, **options):
+        super(Command, self).set_options(**options)
+        self.jobs = max(options.get('jobs') or 1, 1)
+        self.tenant = options.get('tenant')
+        self.dedup = options.get('dedup')
+        if self.tenant:
+            self.post_process = False
+
     def collect(self):
-         
-        results = super(Command, self).collect()
+        """
+        Collects the static files like collectstatic, with the files of the
+        tenant static directories collected as well:
+         - MULTI_TENANT_DIR/gent/static/images/logo.png
+        is collected to
+         - STATIC_ROOT/gent/images/logo.png
+
+        Files are copied or linked with up to `jobs` threads. Tenant files
+        that did not change since they were last collected are skipped
+        without looking at the destination.
+        """
+        if self.symlink and not self.local:
+            raise CommandError("Can't symlink to a remote destination.")
+
+        if self.dedup and (self.symlink or not self.local):
+            raise CommandError("--dedup needs a local destination and can't be used with --link.")
+
+        if self.tenant and not any(
+                isinstance(finder, TenantStaticFilesFinder) and self.tenant in finder.index
+                for finder in finders.get_finders()):
+            raise CommandError("No static files found for tenant '{}'".format(self.tenant))
+
+        if self.clear:
+            self.clear_dir(self.tenant or '')
 
         if self.symlink:
             handler = self.link_file
         else:
             handler = self.copy_file
 
-        # Now check for static assets for each client.
-        # If the asset is located in:
-        #  - clients/gent/assets/images..
-        # then the asset will be collected to 
-        #  - static/assets/gent/images
-        found_files = SortedDict()
+        manifest = self.load_manifest()
+        # Without the files of the other tenants, their blobs are still used
+        complete = manifest is not None or not self.tenant
+        manifest = manifest or {}
+        if self.clear:
+            prefix = self.tenant + os.sep if self.tenant else ''
+            manifest = dict((path, value) for path, value in manifest.items() if not path.startswith(prefix))
+        collected = {}
 
-        # TenantStaticFilesFinder
-        tenant_dir = getattr(settings, 'MULTI_TENANT_DIR', None)
+        found_files = OrderedDict()
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = []
+            for finder in finders.get_finders():
+                is_tenant_finder = isinstance(finder, TenantStaticFilesFinder)
+                if self.tenant and not is_tenant_finder:
+                    continue
 
-        for finder in finders.get_finders():
-            if isinstance(finder, TenantStaticFilesFinder):
-                for path, storage in finder.list(self.ignore_patterns):
+                if is_tenant_finder:
+                    files = finder.scan(self.ignore_patterns, tenants=[self.tenant] if self.tenant else None)
+                else:
+                    files = finder.list(self.ignore_patterns)
+
+                for path, source_storage in files:
                     # Prefix the relative path if the source storage contains it
-                    if getattr(storage, 'prefix', None):
-                        prefixed_path = os.path.join(storage.prefix, path)
+                    if getattr(source_storage, 'prefix', None):
+                        prefixed_path = os.path.join(source_storage.prefix, path)
                     else:
                         prefixed_path = path
 
-                    if prefixed_path not in found_files:
-                        found_files[prefixed_path] = (storage, path)
-                        handler(path, prefixed_path, storage)
+                    if prefixed_path in found_files:
+                        self.log(
+                            "Found another file with the destination path '%s'. It "
+                            "will be ignored since only the first encountered file "
+                            "is collected." % prefixed_path,
+                            level=1,
+                        )
+                        continue
+
+                    found_files[prefixed_path] = (source_storage, path)
+                    if is_tenant_finder:
+                        futures.append(executor.submit(
+                            self.collect_tenant_file, handler, path, prefixed_path, source_storage, manifest,
+                            collected
+                        ))
+                    else:
+                        futures.append(executor.submit(handler, path, prefixed_path, source_storage))
+
+                if is_tenant_finder:
+                    self.log('Scanned {} entries in {:.2f}s'.format(finder.scanned, finder.scan_seconds), level=1)
+
+            for future in futures:
+                future.result()
+
+        # Files that are no longer in the tenants collected are dropped
+        if self.tenant:
+            prefix = self.tenant + os.sep
+            manifest = dict((path, value) for path, value in manifest.items() if not path.startswith(prefix))
+            manifest.update(collected)
+        else:
+            manifest = collected
+        if not self.dry_run:
+            self.save_manifest(manifest)
+
+        if self.dedup:
+            blobs = dict((value[2], value[0]) for value in manifest.values())
+            if complete and not self.dry_run:
+                self.remove_unused_blobs(blobs)
+            self.log('Stored {} tenant files as {} blobs, {} bytes saved'.format(
+                len(manifest), len(blobs), sum(value[0] for value in manifest.values()) - sum(blobs.values())
+            ), level=1)
+
+        # Storage backends may define a post_process() method.
+        if self.post_process and hasattr(self.storage, 'post_process'):
+            processor = self.storage.post_process(found_files, dry_run=self.dry_run)
+            for original_path, processed_path, processed in processor:
+                if isinstance(processed, Exception):
+                    self.stderr.write("Post-processing '%s' failed!" % original_path)
+                    self.stderr.write("")
+                    raise processed
+                if processed:
+                    self.log("Post-processed '%s' as '%s'" % (original_path, processed_path), level=2)
+                    self.post_processed_files.append(original_path)
+                else:
+                    self.log("Skipped post-processing '%s'" % original_path)
 
         return {
             'modified': self.copied_files + self.symlinked_files,
             'unmodified': self.unmodified_files,
             'post_processed': self.post_processed_files,
         }
+
+    def collect_tenant_file(self, handler, path, prefixed_path, source_storage, manifest, collected):
+        """
+        Collects a tenant file, unless its size and modification time or its
+        hash are the same as when it was last collected.
+        """
+        stat = os.stat(source_storage.path(path))
+        previous = manifest.get(prefixed_path)
+
+        if previous and previous[:2] == [stat.st_size, stat.st_mtime]:
+            file_hash = previous[2]
+        else:
+            file_hash = _file_hash(source_storage.path(path))
+            if not previous or previous[2] != file_hash:
+                if self.dedup:
+                    self.dedup_file(path, prefixed_path, source_storage, file_hash)
+                else:
+                    handler(path, prefixed_path, source_storage)
+                collected[prefixed_path] = [stat.st_size, stat.st_mtime, file_hash]
+                return
+
+        self.unmodified_files.append(prefixed_path)
+        self.log("Skipping '%s' (not modified)" % path)
+        collected[prefixed_path] = [stat.st_size, stat.st_mtime, file_hash]
+
+    def dedup_file(self, path, prefixed_path, source_storage, file_hash):
+        """
+        Links ``prefixed_path`` to the blob with the content of ``path``,
+        storing the blob first if it is the first file with this content.
+        """
+        source_path = source_storage.path(path)
+        if self.dry_run:
+            self.log("Pretending to link '%s' to its blob" % source_path, level=1)
+            return
+
+        blob_path = self.storage.path(os.path.join(BLOBS_DIR, file_hash[:2], file_hash))
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # Other threads may store the same blob, so replace it atomically
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path))
+            try:
+                with os.fdopen(fd, 'wb') as f, open(source_path, 'rb') as source_file:
+                    shutil.copyfileobj(source_file, f)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, blob_path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+
+        self.log("Linking '%s' to its blob" % source_path, level=2)
+        full_path = self.storage.path(prefixed_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if os.path.lexists(full_path):
+            os.unlink(full_path)
+
+        if self.dedup == 'symlink':
+            os.symlink(os.path.relpath(blob_path, os.path.dirname(full_path)), full_path)
+        else:
+            os.link(blob_path, full_path)
+        self.copied_files.append(prefixed_path)
+
+    def remove_unused_blobs(self, blobs):
+        """
+        Deletes the blobs of files that changed or were removed.
+        """
+        blobs_dir = self.storage.path(BLOBS_DIR)
+        if not os.path.isdir(blobs_dir):
+            return
+
+        for entry in os.scandir(blobs_dir):
+            if not entry.is_dir():
+                continue
+            for blob in os.scandir(entry.path):
+                if blob.name not in blobs:
+                    self.log("Deleting unused blob '%s'" % blob.name)
+                    os.unlink(blob.path)
+
+    def manifest_path(self):
+        """
+        Returns the path of the manifest, in STATIC_ROOT unless it is set
+        with TENANT_STATIC_MANIFEST, or None without either.
+        """
+        path = getattr(settings, 'TENANT_STATIC_MANIFEST', None)
+        if path is None and settings.STATIC_ROOT:
+            path = os.path.join(settings.STATIC_ROOT, MANIFEST_FILE)
+        return path
+
+    def load_manifest(self):
+        """
+        Returns the tenant files as last collected to the same destination
+        in the same way, or None if there is no such manifest.
+        """
+        if self.manifest_path() is None:
+            return None
+
+        try:
+            with open(self.manifest_path()) as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (manifest.get('destination'), manifest.get('symlink'), manifest.get('dedup')) != \
+                (self._destination(), self.symlink, self.dedup):
+            return None
+        return manifest.get('files', {})
+
+    def save_manifest(self, files):
+        path = self.manifest_path()
+        if path is None:
+            return
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            json.dump({
+                'destination': self._destination(),
+                'symlink': self.symlink,
+                'dedup': self.dedup,
+                'files': files,
+            }, f, indent=1, sort_keys=True)
+
+    def _destination(self):
+        if self.local:
+            return self.storage.path('')
+        return '{}.{}'.format(self.storage.__class__.__module__, self.storage.__class__.__name__)
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
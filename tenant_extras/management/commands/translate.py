@@ -1,17 +1,27 @@
 #-*- coding: utf-8 -*-
+import fnmatch
+import hashlib
+import importlib.util
+import io
+import json
 import os
-import re
-import sys
-import subprocess
-import StringIO
-
-from optparse import make_option, OptionParser
-
-import pip
+import tokenize
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
+from django.template import TemplateSyntaxError
+
+from tenant_extras.utils import get_cache_path
+
+EXTENSIONS = ['html', 'py', 'hbs', 'txt']
+
+KEYWORDS = set([
+    '_', 'gettext', 'gettext_lazy', 'gettext_noop', 'ugettext', 'ugettext_lazy', 'ugettext_noop',
+    'ngettext', 'ngettext_lazy', 'ungettext', 'ungettext_lazy',
+    'pgettext', 'pgettext_lazy', 'npgettext', 'npgettext_lazy',
+])
 
 
 class Command(BaseCommand):
@@ -26,15 +36,21 @@ class Command(BaseCommand):
                     help='compile the .po to .mo files.'),
         parser.add_argument('--pocmd', '-d', dest='pocmd', default='makepo',
                     help='alternative command to generate po files'),
+        parser.add_argument('--incremental', '-i', dest='incremental', action='store_true', default=False,
+                    help='only generate po files if the messages in the source files changed.'),
+        parser.add_argument('--jobs', '-j', dest='jobs', type=int, default=1,
+                    help='number of jobs to run at the same time.'),
 
     def handle(self, *args, **options):
         default_ignore = ['*.orig', '.*', '.git', '*~', '*.pyc', '*.egg', '*.egg-info']
         default_ignore += ['tests', 'static', 'build', 'node_modules', 'bower_components', 'sass', 'static', 'private', 'env', 'build', 'dist', 'frontend', 'tenants']
+        include_paths = ['bluebottle']
 
         self.verbosity = options.get('verbosity')
         self.compile = options.get('compile')
         self.locale = options.get('locale')
         self.pocmd = options.get('pocmd')
+        self.jobs = max(options.get('jobs') or 1, 1)
 
         if not self.locale:
             self.locale = ['en', 'en_GB', 'nl', 'fr']
@@ -52,18 +68,30 @@ class Command(BaseCommand):
             if not os.path.exists(locale_dir):
                 os.makedirs(locale_dir)
 
-        # Generate po file for tenant
-        call_command(self.pocmd,
-                     verbosity=self.verbosity,
-                     domain='django',
-                     all=True,
-                     no_wrap=True,
-                     no_obsolete=True,
-                     keep_pot=False,
-                     extensions=['html', 'py', 'hbs', 'txt'],
-                     ignore_patterns=default_ignore,
-                     include_paths=['bluebottle'],
-                     locale=self.locale)
+        cache = None
+        changed = True
+        if options.get('incremental'):
+            cache = extract_messages([os.curdir] + include_paths, default_ignore, self.locale, self.jobs)
+            changed = self._messages_changed(cache)
+            if not changed:
+                self.stdout.write('> Messages are unchanged, skipping {}'.format(self.pocmd))
+
+        if changed:
+            # Generate po file for tenant
+            call_command(self.pocmd,
+                         verbosity=self.verbosity,
+                         domain='django',
+                         all=True,
+                         no_wrap=True,
+                         no_obsolete=True,
+                         keep_pot=False,
+                         extensions=EXTENSIONS,
+                         ignore_patterns=default_ignore,
+                         include_paths=include_paths,
+                         locale=self.locale)
+
+            if cache is not None:
+                _save_cache(cache)
 
         if options.get('tenant'):
             tenant = options.get('tenant')
@@ -73,5 +101,156 @@ class Command(BaseCommand):
             for tenant in tenants:
                 self._handle_success(tenant)
 
+    def _messages_changed(self, cache):
+        previous = _load_cache()
+        if previous.get('messages') != cache['messages'] or previous.get('locale') != cache['locale']:
+            return True
+
+        # The po files may have been removed or never been generated
+        for locale in self.locale:
+            po_file = os.path.join(settings.PROJECT_ROOT, 'locale', locale, 'LC_MESSAGES', 'django.po')
+            if not os.path.exists(po_file):
+                return True
+        return False
+
     def _handle_success(self, tenant, **options):
         pass
+
+
+def extract_messages(roots, ignore_patterns, locale, jobs=1):
+    """
+    Returns the cache of the messages in the source files below the roots.
+    Only files that changed since the last run are extracted again, with up
+    to `jobs` processes.
+    """
+    files = {}
+    previous = _load_cache().get('files', {})
+
+    todo = []
+    for path in _find_source_files(roots, ignore_patterns):
+        stat = os.stat(path)
+        cached = previous.get(path)
+        if cached and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+            files[path] = cached
+        else:
+            todo.append((path, stat))
+
+    if todo:
+        # Parsing is CPU bound, so it needs processes to run in parallel
+        executor_class = ProcessPoolExecutor if jobs > 1 else ThreadPoolExecutor
+        with executor_class(max_workers=jobs) as executor:
+            results = executor.map(
+                _extract_file,
+                [path for path, stat in todo],
+                [(previous.get(path) or {}).get('hash') for path, stat in todo],
+                chunksize=max(len(todo) // (jobs * 4), 1)
+            )
+            for (path, stat), (file_hash, msgids) in zip(todo, results):
+                if msgids is None:
+                    # Touched, but the content is the same
+                    msgids = previous[path]['msgids']
+                files[path] = {
+                    'mtime': stat.st_mtime,
+                    'size': stat.st_size,
+                    'hash': file_hash,
+                    'msgids': msgids,
+                }
+
+    digest = hashlib.sha1()
+    for path in sorted(files):
+        for msgid in files[path]['msgids']:
+            digest.update(msgid.encode('utf-8') + b'\x00')
+
+    return {
+        'files': files,
+        'locale': sorted(locale),
+        'messages': digest.hexdigest(),
+    }
+
+
+def _find_source_files(roots, ignore_patterns):
+    def ignored(name):
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in ignore_patterns)
+
+    for root in roots:
+        if not os.path.isdir(root):
+            # Include paths may be the names of installed packages
+            try:
+                spec = importlib.util.find_spec(root)
+            except (ImportError, ValueError):
+                spec = None
+            if spec is None or not spec.submodule_search_locations:
+                continue
+            root = list(spec.submodule_search_locations)[0]
+
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not ignored(d))
+            for f in sorted(filenames):
+                if f.rsplit('.', 1)[-1] in EXTENSIONS and not ignored(f):
+                    yield os.path.normpath(os.path.join(dirpath, f))
+
+
+def _extract_file(path, previous_hash=None):
+    """
+    Returns the hash of the file and the messages marked for translation in
+    it, or None for the messages if the hash is the same as before.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    file_hash = hashlib.sha1(data).hexdigest()
+    if file_hash == previous_hash:
+        return file_hash, None
+
+    try:
+        src = data.decode('utf-8')
+        if not path.endswith('.py'):
+            from django.utils.translation.template import templatize
+            src = templatize(src, origin=path)
+        return file_hash, _python_messages(src)
+    except (UnicodeDecodeError, SyntaxError, tokenize.TokenError, TemplateSyntaxError, ValueError):
+        # Any change in a file that can't be parsed counts as a change
+        return file_hash, ['#' + file_hash]
+
+
+def _python_messages(src):
+    """
+    Returns the string literals in the gettext calls of Python source.
+    """
+    messages = []
+    depth = 0
+    previous = None
+    for token in tokenize.generate_tokens(io.StringIO(src).readline):
+        if depth:
+            if token.string == '(':
+                depth += 1
+            elif token.string == ')':
+                depth -= 1
+            elif token.type == tokenize.STRING:
+                messages.append(token.string)
+        elif token.string == '(' and previous is not None and \
+                previous.type == tokenize.NAME and previous.string in KEYWORDS:
+            depth = 1
+        previous = token
+    return messages
+
+
+def _cache_path():
+    # Messages extracted per source file by the last run
+    return get_cache_path('translate', os.path.join(settings.PROJECT_ROOT, 'locale'))
+
+
+def _load_cache():
+    try:
+        with open(_cache_path()) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    path = _cache_path()
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
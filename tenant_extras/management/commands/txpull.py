@@ -1,28 +1,12 @@
 import os
-import re
 import shutil
 import sys
-import subprocess
-import StringIO
-import contextlib
-
-from optparse import make_option, OptionParser
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from txclib.project import Project
-
-
-@contextlib.contextmanager
-def temp_chdir(path):
-    starting_directory = os.getcwd()
-    try:
-        os.chdir(path)
-        yield
-    finally:
-        os.chdir(starting_directory)
-
 
 class Command(BaseCommand):
     help = "Pull tenant translations from Transifex."
@@ -38,6 +22,8 @@ class Command(BaseCommand):
                             help='Pull translations to frontend directory.'),
         parser.add_argument('--frontend-dir', '-e', dest='frontend_dir', default='frontend/lib',
                             help='Pull translations to frontend directory.'),
+        parser.add_argument('--jobs', '-j', dest='jobs', type=int, default=1,
+                            help='Number of tenants to pull at the same time with --all.'),
 
     def handle(self, *args, **options):
         process_all = options.get('all')
@@ -45,6 +31,7 @@ class Command(BaseCommand):
         deploy = options.get('deploy')
         frontend = options.get('frontend')
         frontend_dir = options.get('frontend_dir')
+        jobs = max(options.get('jobs') or 1, 1)
 
         if tenant is not None and process_all:
             raise CommandError("The --tenant option can't be used for --all.")
@@ -59,10 +46,51 @@ class Command(BaseCommand):
             # the list of tenants as this dir will only contain
             # tenant names.
             tenant_dir = getattr(settings, 'MULTI_TENANT_DIR', None)
-            for tenant in [f for f in os.listdir(tenant_dir) if os.path.isdir(os.path.join(tenant_dir, f))]:
-                self._pull(tenant, frontend, frontend_dir, deploy)
+            tenants = [f for f in os.listdir(tenant_dir) if os.path.isdir(os.path.join(tenant_dir, f))]
         else:
-            self._pull(tenant, frontend, frontend_dir, deploy)
+            tenants = [tenant]
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                (tenant, executor.submit(self._timed_pull, tenant, frontend, frontend_dir, deploy))
+                for tenant in tenants
+            ]
+            for tenant, future in futures:
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    failed.append(tenant)
+                    self.stderr.write('> Failed to pull translations for {}: {}'.format(tenant, e))
+                else:
+                    self.stdout.write('> Pulled translations for {} in {:.2f}s'.format(tenant, seconds))
+
+        if failed:
+            raise CommandError('Pulling translations failed for {}'.format(', '.join(failed)))
+
+    def get_project(self, tenant_dir):
+        """
+        Returns the Transifex project of the tenant directory. A .transifexrc
+        in the tenant directory is used over the one of the user.
+        """
+        from txclib.project import Project
+
+        project = Project(tenant_dir)
+
+        # The client only looks for a .transifexrc in the working directory,
+        # which tenants pulled at the same time can't share. Setting it
+        # afterwards uses the internals of the version pinned in setup.py.
+        txrc_file = os.path.join(tenant_dir, '.transifexrc')
+        if os.path.exists(txrc_file):
+            project.txrc_file = txrc_file
+            project.txrc = project._get_transifex_config([txrc_file])
+
+        return project
+
+    def _timed_pull(self, tenant, frontend, frontend_dir, deploy):
+        start = time.time()
+        self._pull(tenant, frontend, frontend_dir, deploy)
+        return time.time() - start
 
     def _pull(self, tenant, frontend, frontend_dir, deploy):
         self.stdout.write('> Pulling translations for {}...'.format(tenant))
@@ -71,15 +99,16 @@ class Command(BaseCommand):
             tenant_dir = os.path.join(settings.PROJECT_ROOT, frontend_dir, tenant)
         else:
             tenant_dir = os.path.join(getattr(settings, 'MULTI_TENANT_DIR', None), tenant)
-
-        with temp_chdir(tenant_dir):
-            # Pull latest translations from Transifex
-            project = Project(tenant_dir)
-            project.pull(fetchsource=False, force=True, overwrite=True, fetchall=True)
-
-            # Move en_GB to en
-            if deploy:
-                self.stdout.write('--> Move en_GB to en directory for {}...'.format(tenant))
-                if os.path.isdir('locale/en'):
-                    shutil.rmtree('locale/en')
-                os.rename('locale/en_GB', 'locale/en')
+        tenant_dir = os.path.abspath(tenant_dir)
+
+        # Pull latest translations from Transifex
+        project = self.get_project(tenant_dir)
+        project.pull(fetchsource=False, force=True, overwrite=True, fetchall=True)
+
+        # Move en_GB to en
+        if deploy:
+            self.stdout.write('--> Move en_GB to en directory for {}...'.format(tenant))
+            locale_dir = os.path.join(tenant_dir, 'locale')
+            if os.path.isdir(os.path.join(locale_dir, 'en')):
+                shutil.rmtree(os.path.join(locale_dir, 'en'))
+            os.rename(os.path.join(locale_dir, 'en_GB'), os.path.join(locale_dir, 'en'))
@@ -1,16 +1,19 @@
 #-*- coding: utf-8 -*-
 
+import hashlib
+import json
 import os
-import re
-import sys
-import subprocess
-import StringIO
-
-from optparse import make_option, OptionParser
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
+from django.core.management.base import CommandError
+from tenant_extras.utils import get_cache_path
+
 from .translate import Command as BaseCommand
 
+# Header lines of .po files that change on every run of makemessages
+VOLATILE_LINES = (b'"POT-Creation-Date:', b'"PO-Revision-Date:')
+
 
 class Command(BaseCommand):
     help = "Tenant translations with optional Transifex push."
@@ -20,17 +23,109 @@ class Command(BaseCommand):
 
         parser.add_argument('--push', '-p', dest='push', action='store_true',
                             default=False, help='Push translations to Transifex.'),
+        parser.add_argument('--push-all', dest='push_all', action='store_true', default=False,
+                            help='Push all resources, also the ones unchanged since the last push.'),
+        # Pushes are network bound, so run more of them at the same time
+        parser.set_defaults(jobs=4)
 
     def handle(self, *args, **options):
         self.push = options.get('push')
+        self.push_all = options.get('push_all')
+        self.pushes = []
+
+        with ThreadPoolExecutor(max_workers=max(options.get('jobs') or 1, 1)) as self.executor:
+            super(Command, self).handle(*args, **options)
+
+        failed = []
+        for tenant, resources, future in self.pushes:
+            try:
+                future.result()
+            except Exception as e:
+                failed.append(tenant)
+                self.stderr.write('> Failed to push translations for {}: {}'.format(tenant, e))
+            else:
+                self.stdout.write('> Pushed {} for {}'.format(', '.join(resources), tenant))
+
+        if failed:
+            raise CommandError('Pushing translations failed for {}'.format(', '.join(failed)))
 
-        super(Command, self).handle(*args, **options)
+    def get_project(self, tenant_dir):
+        from txclib.project import Project
+
+        return Project(path_to_tx=tenant_dir)
 
     def _handle_success(self, tenant, **options):
         if self.push:
-            from txclib.project import Project
+            tenant_dir = os.path.join(getattr(settings, 'MULTI_TENANT_DIR', None), tenant)
+            project = self.get_project(tenant_dir)
+
+            pushed = _load_hashes(tenant_dir)
+            hashes = _resource_hashes(project)
+            resources = [
+                resource for resource, resource_hash in sorted(hashes.items())
+                if self.push_all or resource_hash is None or pushed.get(resource) != resource_hash
+            ]
+
+            if not resources:
+                self.stdout.write('> Translations for {} are unchanged'.format(tenant))
+                return
 
             self.stdout.write('> Pushing translations for {}...'.format(tenant))
-            tenant_dir = os.path.join(getattr(settings, 'MULTI_TENANT_DIR', None), tenant)
-            project = Project(path_to_tx=tenant_dir)
-            project.push(source=True, no_interactive=True)
+            future = self.executor.submit(
+                self._push, project, tenant_dir, resources, dict(pushed, **hashes)
+            )
+            self.pushes.append((tenant, resources, future))
+
+    def _push(self, project, tenant_dir, resources, hashes):
+        project.push(source=True, no_interactive=True, resources=resources)
+        _save_hashes(tenant_dir, hashes)
+
+
+def _resource_hashes(project):
+    """
+    Returns the hash of the source file per resource of the project, or
+    None for resources without a source file.
+    """
+    hashes = {}
+    for resource in project.get_resource_list():
+        source_file = project.get_source_file(resource)
+        try:
+            hashes[resource] = _source_hash(project.get_full_path(source_file))
+        except (IOError, OSError, TypeError):
+            hashes[resource] = None
+    return hashes
+
+
+def _source_hash(path):
+    """
+    Returns the hash of a source file, leaving out the creation and revision
+    dates in the header, so regenerating an unchanged file keeps the hash.
+    """
+    source_hash = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.startswith(VOLATILE_LINES):
+                source_hash.update(line)
+    return source_hash.hexdigest()
+
+
+def _hashes_path(tenant_dir):
+    # Hashes of the source resources as they were last pushed
+    return get_cache_path('txtranslate', tenant_dir)
+
+
+def _load_hashes(tenant_dir):
+    try:
+        with open(_hashes_path(tenant_dir)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _save_hashes(tenant_dir, hashes):
+    hashes = dict((resource, value) for resource, value in hashes.items() if value is not None)
+    path = _hashes_path(tenant_dir)
+    # Tenants are pushed at the same time
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
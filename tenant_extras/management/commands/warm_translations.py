@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from tenant_schemas.utils import get_tenant_model
+
+from tenant_extras.middleware import warm_tenant_translations
+from tenant_extras.utils import get_tenant_names
+
+
+class Command(BaseCommand):
+    help = "Build the translations of all tenants in MULTI_TENANT_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', '-t', dest='tenant', action='append',
+                            help='Tenant(s) to warm. Default is all tenants. Can be used multiple times.'),
+        parser.add_argument('--locale', '-l', dest='locale', action='append',
+                            help='Language(s) to warm. Default is all in LANGUAGES. Can be used multiple times.'),
+
+    def handle(self, *args, **options):
+        tenant_names = options.get('tenant') or get_tenant_names()
+
+        # Activate tenants that exist, so they fall back to their own language
+        tenants = dict(
+            (tenant.client_name, tenant)
+            for tenant in get_tenant_model().objects.filter(client_name__in=tenant_names)
+        )
+        for tenant_name in tenant_names:
+            if tenant_name not in tenants:
+                self.stderr.write('No tenant found for {}, using the active properties'.format(tenant_name))
+
+        result = warm_tenant_translations(
+            [tenants.get(tenant_name, tenant_name) for tenant_name in tenant_names],
+            languages=options.get('locale')
+        )
+
+        self.stdout.write(
+            'Built {translations} translations in {seconds:.2f}s, '
+            '{size} bytes of catalogs, peak RSS +{rss} KB'.format(**result)
+        )
@@ -1,23 +1,107 @@
-import importlib
+import contextlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
 
-from django.db import connection
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
 
 from tenant_schemas.management.commands.tenant_command import Command as TenantCommand
+from tenant_schemas.utils import get_public_schema_name, get_tenant_model
+
+from tenant_extras.utils import activate_tenant
+
+# Options of the base command that apply to this command, not to the
+# command run per tenant, which writes to its own output
+BASE_OPTIONS = ('stdout', 'stderr', 'no_color', 'force_color', 'settings', 'pythonpath')
 
 class Command(TenantCommand):
 
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--all-tenants', dest='all_tenants', action='store_true', default=False,
+                            help='Run the command for every tenant.'),
+        parser.add_argument('--jobs', '-j', dest='jobs', type=int, default=1,
+                            help='Number of tenants to run the command for at the same time with --all-tenants.'),
+
     def handle(self, *args, **options):
-        tenant = self.get_tenant_from_options_or_interactive(**options)
+        all_tenants = options.pop('all_tenants', False)
+        jobs = max(options.pop('jobs', 1) or 1, 1)
 
-        # Set tenant on database connection
-        connection.set_tenant(tenant)
+        if all_tenants:
+            return self.handle_all_tenants(args, options, jobs)
 
-        # Also load tenant properties
-        tenant_model_path = tenant.__module__
-        tenant_app_path = tenant_model_path.replace('.models', '')
-        properties = importlib.import_module(tenant_app_path).properties
-        properties.set_tenant(tenant)
+        tenant = self.get_tenant_from_options_or_interactive(**options)
+
+        # Set tenant on database connection and load tenant properties
+        activate_tenant(tenant)
 
         call_command(*args, **options)
 
+    def handle_all_tenants(self, args, options, jobs):
+        """
+        Runs the command for all tenants, with up to `jobs` tenants at a time
+        in worker processes. The output is written per tenant when done.
+        """
+        if 'command' in options:
+            args = (options.pop('command'),) + tuple(args)
+        options.pop('schema_name', None)
+        for name in BASE_OPTIONS:
+            options.pop(name, None)
+
+        schema_names = [
+            tenant.schema_name for tenant in get_tenant_model().objects.all()
+            if tenant.schema_name != get_public_schema_name()
+        ]
+
+        start = time.time()
+        if jobs > 1:
+            # Workers are forked from this process, so they open their own
+            # connection instead of sharing the one of this process.
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork'))
+            with executor:
+                results = list(executor.map(
+                    _run_for_tenant, schema_names, [args] * len(schema_names), [options] * len(schema_names)
+                ))
+        else:
+            results = [_run_for_tenant(schema_name, args, options) for schema_name in schema_names]
+
+        failed = []
+        for schema_name, status, output, seconds in results:
+            self.stdout.write('=== {} (status {}, {:.2f}s)'.format(schema_name, status, seconds))
+            if output:
+                self.stdout.write(output, ending='' if output.endswith('\n') else '\n')
+            if status:
+                failed.append(schema_name)
+
+        self.stdout.write('Ran {} for {} tenants in {:.2f}s, {} failed'.format(
+            args[0], len(results), time.time() - start, len(failed)))
+
+        if failed:
+            raise CommandError('{} failed for {}'.format(args[0], ', '.join(failed)))
+
+
+def _run_for_tenant(schema_name, args, options):
+    """
+    Runs a command for one tenant and returns the schema name, exit status,
+    output and time taken.
+    """
+    start = time.time()
+    output = StringIO()
+    status = 0
+
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            tenant = get_tenant_model().objects.get(schema_name=schema_name)
+            activate_tenant(tenant)
+            call_command(*args, stdout=output, stderr=output, **options)
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            output.write('{}: {}\n'.format(e.__class__.__name__, e))
+            status = getattr(e, 'returncode', 1)
+
+    return schema_name, status, output.getvalue(), time.time() - start
@@ -1,19 +1,116 @@
 "This is locale middleware on top of Django's default LocaleMiddleware."
+import gettext as gettext_module
 import os
+import struct
+import threading
+import time
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import django
 from django import http
+from django.apps import apps
 from django.conf import settings
+from django.core.signals import setting_changed
 from django.db import connection
+from django.dispatch import receiver
 
 from django.middleware.locale import LocaleMiddleware
 from django.utils.translation.trans_real import DjangoTranslation as DjangoTranslationOriginal
+from django.utils.translation import to_locale, trans_real
 from django.utils import translation
 
-from .utils import get_tenant_properties
-from .compat import is_language_prefix_patterns_used
+from .catalogs import MappedCatalog, load_catalog, write_catalog
+from .lru import LRUCache
+from .generations import check_tenant_generation, tenant_changed
+from .utils import activate_tenant, get_tenant_properties
+from .compat import TranslationCatalog, is_language_prefix_patterns_used
 
-_tenants = {}
 _translations = {}
+_missing = object()
+
+# The mtimes of the LOCALE_PATHS catalogs per language, when reloading
+_base_stamps = {}
+
+# Locks of the translations that are being built, per (tenant, language)
+_building = {}
+_building_lock = threading.Lock()
+
+
+def _catalog_size(translation):
+    """
+    Returns the size of the messages in the catalog in bytes, encoded as
+    UTF-8.
+    """
+    catalog = getattr(translation, '_catalog', None) or {}
+    if isinstance(catalog, MappedCatalog):
+        # Mapped catalogs live in the page cache, shared by all processes
+        return 0
+    # The shared base catalog is not part of the tenant translation
+    catalog = getattr(catalog, 'overlay', catalog)
+
+    size = 0
+    for key, value in catalog.items():
+        if isinstance(key, tuple):
+            key = key[0]
+        size += len(key.encode('utf-8')) + len(value.encode('utf-8'))
+    return size
+
+
+# Translations per (tenant, language), bounded by TENANT_TRANSLATION_CACHE_SIZE
+# entries and/or TENANT_TRANSLATION_CACHE_BYTES. A translation keeps its
+# fallback translation referenced, so an evicted fallback is only freed
+# once the translations that fall back to it are evicted as well.
+_tenants = LRUCache(
+    maxsize=getattr(settings, 'TENANT_TRANSLATION_CACHE_SIZE', None),
+    maxweight=getattr(settings, 'TENANT_TRANSLATION_CACHE_BYTES', None),
+    weigher=_catalog_size
+)
+
+
+class LayeredCatalog(object):
+    """
+    Catalog that looks up the messages of the tenant first and then the
+    catalog of the language that is shared by all tenants.
+    """
+    def __init__(self, overlay, base):
+        self.overlay = overlay
+        self.base = base
+
+    def __getitem__(self, key):
+        try:
+            return self.overlay[key]
+        except KeyError:
+            return self.base[key]
+
+    def __contains__(self, key):
+        return key in self.overlay or key in self.base
+
+    def get(self, key, default=None):
+        value = self.overlay.get(key, _missing)
+        if value is _missing:
+            return self.base.get(key, default)
+        return value
+
+    def keys(self):
+        return [key for key, value in self.items()]
+
+    def items(self):
+        items = {}
+        for key, value in self.base.items():
+            items.setdefault(key, value)
+        for key, value in self.overlay.items():
+            items[key] = value
+        return items.items()
+
+    def plural(self, msgid, num):
+        try:
+            return self.overlay.plural(msgid, num)
+        except KeyError:
+            return self.base.plural(msgid, num)
 
 
 class DjangoTranslation(DjangoTranslationOriginal):
@@ -26,48 +123,427 @@ class DjangoTranslation(DjangoTranslationOriginal):
     requested language and add a fallback to the default language, if it's
     different from the requested language.
     """
-    def __init__(self, language, tenant_name):
+    def __init__(self, language, tenant_name, use_catalog_file=True):
         self.tenant_name = tenant_name
+        self.use_catalog_file = use_catalog_file
+        self.merged = False
+        self.merged_fallback = None
+        self.single_plural = True
+
+        reload = getattr(settings, 'TENANT_TRANSLATION_RELOAD_INTERVAL', None) is not None
+        if reload:
+            _refresh_base_translation(language)
+
         DjangoTranslationOriginal.__init__(self, language)
 
+        if reload:
+            self.catalog_stamp = _catalog_stamp(self)
+            self.checked_at = time.monotonic()
+
+    def _init_translation_catalog(self):
+        """The global catalogs are part of the shared base catalog."""
+
+    def _add_installed_apps_translations(self):
+        """The app catalogs are part of the shared base catalog."""
+
     def _add_local_translations(self):
-        """Merges translations defined for tenant and standard locale."""
-        locale_paths = [os.path.join(settings.MULTI_TENANT_DIR, self.tenant_name, 'locale')]
-        locale_paths.extend(settings.LOCALE_PATHS)
+        """
+        Layers the translations defined for tenant over the catalog of Django,
+        the apps and LOCALE_PATHS, which is shared by all tenants.
 
-        for localedir in reversed(locale_paths):
-            translation = self._new_gnu_trans(localedir)
-            self.merge(translation)
+        With TENANT_TRANSLATION_BACKEND set to 'mmap' the merged catalog is
+        written to a catalog file once, and mapped by every process. A catalog
+        file that was pre-merged by `compilepo --merge` is always used.
+        """
+        if not self.use_catalog_file:
+            mapped = False
+        else:
+            mapped = getattr(settings, 'TENANT_TRANSLATION_BACKEND', 'gettext') == 'mmap'
+            if self._load_mapped_catalog(merged_only=not mapped):
+                return
 
-    def _add_fallback(self, localdirs=[]):
-        """Sets the GNUTranslations() fallback with the default language."""
+        localedir = os.path.join(settings.MULTI_TENANT_DIR, self.tenant_name, 'locale')
+        self.merge(self._new_gnu_trans(localedir))
+
+        base = trans_real.translation(self.language())
+        plurals = [base.plural] + _plural_functions(base._catalog)
+        if self._catalog is None:
+            # The tenant has no translations for this language
+            self.plural = base.plural
+            self._info = base._info.copy()
+            overlay = TranslationCatalog()
+        else:
+            overlay = self._catalog
+            plurals += [self.plural] + _plural_functions(overlay)
+
+        self._catalog = LayeredCatalog(overlay, base._catalog)
+        # A flattened catalog has a single plural function for all layers
+        self.single_plural = len(set(plural.__code__ for plural in plurals)) == 1
+
+        if mapped and self.single_plural:
+            self._write_mapped_catalog()
+            self._load_mapped_catalog()
+
+    def _catalog_source(self, languages=None):
+        """
+        Describes the .mo files a catalog file is built from, to detect
+        stale catalog files.
+        """
+        localedirs = [os.path.join(settings.MULTI_TENANT_DIR, self.tenant_name, 'locale')]
+        localedirs.extend(settings.LOCALE_PATHS)
+        # The catalogs of the installed apps, as added by Django
+        localedirs.extend(
+            os.path.join(app_config.path, 'locale')
+            for app_config in reversed(list(apps.get_app_configs()))
+        )
+
+        if languages is None:
+            languages = [self.language()]
+
+        return {
+            'django': django.get_version(),
+            'stamp': list(_stamp(
+                path for language in languages for path in _catalog_files(language, localedirs)
+            )),
+        }
+
+    def _load_mapped_catalog(self, merged_only=False):
+        path = catalog_path(self.language(), self.tenant_name)
+        try:
+            catalog = load_catalog(path)
+        except (IOError, OSError, ValueError, struct.error):
+            return False
+
+        merged = catalog.meta.get('merged', False)
+        if merged_only and not merged:
+            return False
+
+        languages = [self.language()]
+        if catalog.meta.get('fallback'):
+            languages.append(catalog.meta['fallback'])
+        if catalog.meta.get('source') != self._catalog_source(languages):
+            return False
+        # The tenant may fall back to another language by now
+        if merged and catalog.meta.get('fallback') != self._fallback_language():
+            return False
+
+        self.merged = merged
+        if merged:
+            self.merged_fallback = catalog.meta.get('fallback')
+        self._catalog = catalog
+        self.plural = catalog.plural_function
+        self._info = {}
+        if catalog.plural_forms:
+            self._info['plural-forms'] = catalog.plural_forms
+        return True
+
+    def _write_mapped_catalog(self):
+        try:
+            write_catalog(
+                catalog_path(self.language(), self.tenant_name),
+                self._catalog.items(),
+                plural_forms=self._info.get('plural-forms'),
+                meta={'source': self._catalog_source()}
+            )
+        except (IOError, OSError):
+            # Keep using the catalog in memory
+            pass
+
+    def _fallback_language(self):
+        """
+        Returns the default language of the tenant, or None if this
+        translation doesn't fall back to it.
+        """
         # Don't set a fallback for the default language or any English variant
         # (as it's empty, so it'll ALWAYS fall back to the default language)
         lang_code = getattr(get_tenant_properties(), 'LANGUAGE_CODE', None)
         if self.__language == lang_code or self.__language.startswith('en'):
+            return None
+        return lang_code
+
+    def _add_fallback(self, localdirs=[]):
+        """Sets the GNUTranslations() fallback with the default language."""
+        if self.merged:
+            # The fallback is part of the pre-merged catalog
+            return
+        lang_code = self._fallback_language()
+        if lang_code is None:
             return
         default_translation = tenant_translation(lang_code, self.tenant_name)
         self.add_fallback(default_translation)
 
 
+def _plural_functions(catalog):
+    """
+    Returns the plural functions of a TranslationCatalog, which keeps the
+    catalogs with different plural forms apart.
+    """
+    return list(getattr(catalog, '_plurals', []))
+
+
+def catalog_path(language, tenant_name):
+    """
+    Returns the path of the catalog file for a tenant and language, in
+    TENANT_CATALOG_DIR or next to the .mo files of the tenant.
+    """
+    catalog_dir = getattr(settings, 'TENANT_CATALOG_DIR', None)
+    if catalog_dir:
+        return os.path.join(catalog_dir, tenant_name, to_locale(language), 'django.cat')
+
+    return os.path.join(settings.MULTI_TENANT_DIR, tenant_name, 'locale',
+                        to_locale(language), 'LC_MESSAGES', 'django.cat')
+
+
+def write_merged_catalog(language, tenant_name):
+    """
+    Writes the catalog file of a tenant and language, with the catalog of
+    the fallback language merged in. DjangoTranslation loads it instead of
+    building the catalog from the .mo files. Returns the path of the file,
+    or None if the layers of the catalog have different plural forms.
+    """
+    translation = DjangoTranslation(language, tenant_name, use_catalog_file=False)
+    if not translation.single_plural:
+        return None
+
+    items = dict(translation._catalog.items())
+    plural_forms = translation._info.get('plural-forms')
+
+    languages = [language]
+    fallback = translation._fallback
+    if isinstance(fallback, DjangoTranslation):
+        languages.append(fallback.language())
+        # Plural forms are only valid with the plural function they belong to
+        same_plural = fallback._info.get('plural-forms') == plural_forms
+        for key, value in fallback._catalog.items():
+            if same_plural or not isinstance(key, tuple):
+                items.setdefault(key, value)
+
+    path = catalog_path(language, tenant_name)
+    write_catalog(path, items.items(), plural_forms=plural_forms, meta={
+        'source': translation._catalog_source(languages),
+        'merged': True,
+        'fallback': languages[1] if len(languages) > 1 else None,
+    })
+    return path
+
+
 def tenant_translation(language, tenant_name):
     """
     Returns a translation object for the given tenant name and language.
     """
-    global _tenants
-    if tenant_name not in _tenants:
-        _tenants[tenant_name] = {}
+    check_tenant_generation(tenant_name)
+
+    key = (tenant_name, language)
+    t = _tenants.get(key)
+    if t is None or _catalogs_changed(t):
+        t = _build_translation(language, tenant_name, stale=t)
+
+    return t
+
+
+def _catalog_files(language, localedirs):
+    locale = to_locale(language)
+    names = [locale]
+    if locale.split('_')[0] != locale:
+        names.append(locale.split('_')[0])
+
+    for localedir in localedirs:
+        for name in names:
+            yield os.path.join(localedir, name, 'LC_MESSAGES', 'django.mo')
+
+
+def _stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            stamp.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _translation_files(translation):
+    """
+    Returns the .mo files of the tenant and LOCALE_PATHS the translation and
+    its fallback are built from.
+    """
+    languages = [translation.language()]
+    if isinstance(translation._fallback, DjangoTranslation):
+        languages.append(translation._fallback.language())
+    elif translation.merged_fallback:
+        languages.append(translation.merged_fallback)
+
+    localedirs = [os.path.join(settings.MULTI_TENANT_DIR, translation.tenant_name, 'locale')]
+    localedirs.extend(settings.LOCALE_PATHS)
+
+    return [path for language in languages for path in _catalog_files(language, localedirs)]
+
+
+def _catalog_stamp(translation):
+    return _stamp(_translation_files(translation))
+
+
+def _forget_catalogs(paths):
+    """
+    Drops the parsed .mo files from the cache of the gettext module, so
+    they are read again.
+    """
+    paths = set(os.path.abspath(path) for path in paths)
+    for key in list(gettext_module._translations):
+        if key[1] in paths:
+            gettext_module._translations.pop(key, None)
+
+
+def _catalogs_changed(translation):
+    """
+    Returns True if any of the .mo files of the translation or its fallback
+    changed. The files are checked at most once per
+    TENANT_TRANSLATION_RELOAD_INTERVAL, until a change is found.
+    """
+    interval = getattr(settings, 'TENANT_TRANSLATION_RELOAD_INTERVAL', None)
+    if interval is None:
+        return False
+
+    now = time.monotonic()
+    checked_at = getattr(translation, 'checked_at', None)
+    if checked_at is not None and now - checked_at < interval:
+        return False
+
+    stamp = _catalog_stamp(translation)
+    if getattr(translation, 'catalog_stamp', stamp) != stamp:
+        return True
+
+    # The fallback may be older than the stamp, if it was still cached when
+    # this translation was built after its files changed
+    fallback = translation._fallback
+    if isinstance(fallback, DjangoTranslation) and _catalogs_changed(fallback):
+        return True
 
-    _translations = _tenants[tenant_name]
+    translation.checked_at = now
+    translation.catalog_stamp = stamp
+    return False
 
-    t = _translations.get(language, None)
-    if t is None:
-        t = DjangoTranslation(language, tenant_name)
-        _translations[language] = t
+
+def _refresh_base_translation(language):
+    """
+    Drops the shared base translation of Django if its LOCALE_PATHS catalogs
+    changed since the last tenant translation for the language was built.
+    """
+    paths = list(_catalog_files(language, settings.LOCALE_PATHS))
+    stamp = _stamp(paths)
+    if _base_stamps.get(language, stamp) != stamp:
+        _forget_catalogs(paths)
+        trans_real._translations.pop(language, None)
+    _base_stamps[language] = stamp
+
+
+def _build_translation(language, tenant_name, stale=None):
+    """
+    Builds and caches a translation. Threads that miss the same key at the
+    same time wait for the first one instead of building it again.
+    """
+    key = (tenant_name, language)
+
+    with _building_lock:
+        lock = _building.get(key)
+        if lock is None:
+            lock = _building[key] = threading.Lock()
+
+    try:
+        with lock:
+            t = _tenants.get(key)
+            if t is None or t is stale:
+                if stale is not None:
+                    _forget_catalogs(_translation_files(stale))
+                t = DjangoTranslation(language, tenant_name)
+                _tenants.set(key, t)
+    finally:
+        with _building_lock:
+            if _building.get(key) is lock:
+                del _building[key]
 
     return t
 
 
+def warm_tenant_translations(tenants, languages=None):
+    """
+    Builds the translations of the given tenants for every language, all
+    of LANGUAGES by default.
+
+    Tenants can be tenant instances, which are activated first so the
+    fallback follows their LANGUAGE_CODE, or client names, which use the
+    properties that are active when it is called. Calling this from a
+    gunicorn pre_fork hook lets the workers share the catalogs; close the
+    database connections afterwards.
+
+    Returns the number of translations built, the time it took, the growth
+    of the translation cache in bytes and of the peak RSS in KB.
+    """
+    if languages is None:
+        languages = [code for code, name in settings.LANGUAGES]
+
+    start = time.time()
+    size = _tenants.weight
+    rss = _max_rss()
+    count = 0
+    activated = False
+
+    # Client names use the properties that are active when called, so they
+    # are built before any tenant is activated
+    tenants = sorted(tenants, key=lambda tenant: not isinstance(tenant, str))
+    for tenant in tenants:
+        if isinstance(tenant, str):
+            tenant_name = tenant
+        else:
+            activate_tenant(tenant)
+            activated = True
+            tenant_name = tenant.client_name
+
+        for language in languages:
+            tenant_translation(language, tenant_name)
+            count += 1
+
+    if activated:
+        connection.set_schema_to_public()
+
+    return {
+        'translations': count,
+        'seconds': time.time() - start,
+        'size': _tenants.weight - size,
+        'rss': _max_rss() - rss,
+    }
+
+
+def _max_rss():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def get_translation_cache_stats():
+    """
+    Returns the entries, approximate size and hit, miss and eviction counts
+    of the tenant translation cache.
+    """
+    return _tenants.stats()
+
+
+@receiver(tenant_changed)
+def tenant_translations_changed(tenant_name, **kwargs):
+    for key in _tenants.keys():
+        if key[0] == tenant_name:
+            _tenants.pop(key)
+
+
+@receiver(setting_changed)
+def resize_translation_cache(**kwargs):
+    if kwargs['setting'] in ('TENANT_TRANSLATION_CACHE_SIZE', 'TENANT_TRANSLATION_CACHE_BYTES'):
+        _tenants.resize(
+            maxsize=getattr(settings, 'TENANT_TRANSLATION_CACHE_SIZE', None),
+            maxweight=getattr(settings, 'TENANT_TRANSLATION_CACHE_BYTES', None)
+        )
+
+
 class TenantLocaleMiddleware(LocaleMiddleware):
     """
     NOTE:
@@ -0,0 +1,303 @@
+"""
+Compiles .po files to .mo files in-process, without GNU gettext.
+
+Fuzzy, obsolete and untranslated entries are left out, like msgfmt does,
+and entries flagged python-format or python-brace-format get the same
+placeholder checks as `msgfmt --check-format`.
+"""
+import array
+import ast
+import codecs
+import re
+import struct
+import warnings
+
+CHARSET = re.compile(r'charset=([\w-]+)')
+PYTHON_FORMAT = re.compile(
+    r'%(?:\((?P<name>[^)]*)\))?[#0\- +]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?(?P<type>[diouxXeEfFgGcrsa%])'
+)
+BRACE_FORMAT = re.compile(r'(?<!\{)\{(?P<field>[^{}!:]*)[^{}]*\}')
+
+
+class PoFileError(ValueError):
+    pass
+
+
+class Entry(object):
+    def __init__(self):
+        self.flags = set()
+        self.msgctxt = None
+        self.msgid = None
+        self.msgid_plural = None
+        self.msgstr = {}
+        self.line = None
+
+    @property
+    def translated(self):
+        return bool(self.msgstr) and all(self.msgstr.values())
+
+
+def _unquote(line, filename, lineno):
+    try:
+        value = ast.literal_eval(line)
+    except (SyntaxError, ValueError):
+        value = None
+    if not isinstance(value, str) or not line.startswith('"'):
+        raise PoFileError('{0}:{1}: invalid string {2}'.format(filename, lineno, line))
+    return value
+
+
+def parse_po(lines, filename='<po>'):
+    """
+    Returns the entries of a .po file, as a list of Entry.
+    """
+    entries = []
+    entry = Entry()
+    field = None
+
+    def finish(entry):
+        if entry.msgid is not None:
+            entries.append(entry)
+        return Entry()
+
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if line.startswith('#'):
+            if field is not None and field != 'comment':
+                entry = finish(entry)
+            field = 'comment'
+            if line.startswith('#,'):
+                entry.flags.update(flag.strip() for flag in line[2:].split(','))
+            # Obsolete entries (#~) and other comments are ignored
+            continue
+
+        keyword, _, rest = line.partition(' ')
+        if keyword.startswith('"'):
+            if field is None or field == 'comment':
+                raise PoFileError('{0}:{1}: unexpected string'.format(filename, lineno))
+            value = _unquote(line, filename, lineno)
+        else:
+            value = _unquote(rest.strip(), filename, lineno)
+
+            if keyword in ('msgctxt', 'msgid') and field not in (None, 'comment', 'msgctxt'):
+                entry = finish(entry)
+
+            if keyword == 'msgctxt':
+                entry.msgctxt = ''
+            elif keyword == 'msgid':
+                entry.msgid = ''
+                entry.line = lineno
+            elif keyword == 'msgid_plural':
+                entry.msgid_plural = ''
+            elif keyword == 'msgstr':
+                keyword = 0
+            elif keyword.startswith('msgstr[') and keyword.endswith(']'):
+                keyword = int(keyword[7:-1])
+            else:
+                raise PoFileError('{0}:{1}: unknown keyword {2}'.format(filename, lineno, keyword))
+            field = keyword
+
+        if field == 'msgctxt':
+            entry.msgctxt += value
+        elif field == 'msgid':
+            entry.msgid += value
+        elif field == 'msgid_plural':
+            entry.msgid_plural += value
+        else:
+            entry.msgstr[field] = entry.msgstr.get(field, '') + value
+
+    finish(entry)
+    return entries
+
+
+def _python_format(value):
+    named = {}
+    unnamed = []
+    for match in PYTHON_FORMAT.finditer(value):
+        if match.group('type') == '%':
+            continue
+        if match.group('name') is not None:
+            named[match.group('name')] = match.group('type')
+        else:
+            unnamed.append(match.group('type'))
+    return named, unnamed
+
+
+def _check_python_format(msgids, msgstr, plural):
+    named = {}
+    unnamed = []
+    for msgid in msgids:
+        msgid_named, msgid_unnamed = _python_format(msgid)
+        named.update(msgid_named)
+        if len(msgid_unnamed) > len(unnamed):
+            unnamed = msgid_unnamed
+    str_named, str_unnamed = _python_format(msgstr)
+
+    for name, type_ in str_named.items():
+        if named.get(name) != type_:
+            return "format specification '%({0}){1}' doesn't exist in 'msgid'".format(name, type_)
+
+    if plural:
+        # Singular forms often leave out the number
+        if str_unnamed != unnamed[:len(str_unnamed)]:
+            return "format specifications in 'msgid' and 'msgstr' don't match"
+    elif str_unnamed != unnamed:
+        return "format specifications in 'msgid' and 'msgstr' don't match"
+
+
+def _check_brace_format(msgids, msgstr):
+    fields = set(m.group('field') for msgid in msgids for m in BRACE_FORMAT.finditer(msgid))
+    for match in BRACE_FORMAT.finditer(msgstr):
+        if match.group('field') not in fields:
+            return "format specification '{{{0}}}' doesn't exist in 'msgid'".format(match.group('field'))
+
+
+def check_format(entry):
+    """
+    Returns the placeholder errors of a translated entry. Like msgfmt, each
+    plural form is checked against both msgid and msgid_plural, as the form
+    for one may well use the number of msgid_plural.
+    """
+    errors = []
+    plural = entry.msgid_plural is not None
+    if plural:
+        msgids = [entry.msgid, entry.msgid_plural]
+    else:
+        msgids = [entry.msgid]
+
+    for index, msgstr in sorted(entry.msgstr.items()):
+        error = None
+        if 'python-format' in entry.flags:
+            error = _check_python_format(msgids, msgstr, plural)
+        if error is None and 'python-brace-format' in entry.flags:
+            error = _check_brace_format(msgids, msgstr)
+
+        if error:
+            errors.append('{0}: msgstr[{1}]: {2}'.format(entry.line, index, error))
+    return errors
+
+
+def _valid_charset(charset, filename):
+    """
+    Returns the charset, or utf-8 with a warning for the CHARSET placeholder
+    and unknown charsets, like msgfmt.
+    """
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        warnings.warn('{0}: unknown charset {1}, using utf-8'.format(filename, charset))
+        return 'utf-8'
+    return charset
+
+
+def _charset(entries, filename):
+    for entry in entries:
+        if entry.msgid == '' and entry.msgctxt is None:
+            match = CHARSET.search(entry.msgstr.get(0, ''))
+            if match:
+                return _valid_charset(match.group(1), filename)
+    return 'utf-8'
+
+
+def decode_po(data, filename='<po>'):
+    """
+    Returns the lines of .po file data, decoded with the charset declared in
+    its header.
+    """
+    match = CHARSET.search(data.decode('ascii', 'replace'))
+    charset = _valid_charset(match.group(1), filename) if match else 'utf-8'
+    try:
+        return data.decode(charset).splitlines()
+    except UnicodeDecodeError as e:
+        raise PoFileError('{0}: not valid {1}: {2}'.format(filename, charset, e))
+
+
+def compile_po(lines, filename='<po>', check=True):
+    """
+    Returns the .mo data for the lines of a .po file.
+    """
+    entries = parse_po(lines, filename)
+    charset = _charset(entries, filename)
+
+    messages = {}
+    errors = []
+    for entry in entries:
+        header = entry.msgid == '' and entry.msgctxt is None
+        if not entry.translated or ('fuzzy' in entry.flags and not header):
+            continue
+
+        if check:
+            errors.extend('{0}:{1}'.format(filename, error) for error in check_format(entry))
+
+        key = entry.msgid
+        if entry.msgid_plural is not None:
+            key += '\x00' + entry.msgid_plural
+        if entry.msgctxt is not None:
+            key = entry.msgctxt + '\x04' + key
+
+        value = '\x00'.join(entry.msgstr[index] for index in sorted(entry.msgstr))
+        if header:
+            # Readers of the .mo file decode it with the charset in the header
+            value = CHARSET.sub('charset=' + charset, value)
+        try:
+            messages[key.encode(charset)] = value.encode(charset)
+        except UnicodeEncodeError as e:
+            errors.append('{0}:{1}: can not be encoded as {2}: {3}'.format(filename, entry.line, charset, e))
+
+    if errors:
+        raise PoFileError('\n'.join(errors))
+
+    return _mo_data(messages)
+
+
+def _mo_data(messages):
+    """
+    Returns a GNU .mo file without hash table for the encoded messages.
+    """
+    keys = sorted(messages)
+    ids = b''
+    strs = b''
+    offsets = []
+    for key in keys:
+        offsets.append((len(ids), len(key), len(strs), len(messages[key])))
+        ids += key + b'\x00'
+        strs += messages[key] + b'\x00'
+
+    keystart = 7 * 4 + 16 * len(keys)
+    valuestart = keystart + len(ids)
+
+    koffsets = []
+    voffsets = []
+    for id_offset, id_length, str_offset, str_length in offsets:
+        koffsets += [id_length, id_offset + keystart]
+        voffsets += [str_length, str_offset + valuestart]
+
+    output = struct.pack(
+        'Iiiiiii',
+        0x950412de,  # Magic
+        0,  # Version
+        len(keys),  # Number of entries
+        7 * 4,  # Start of key index
+        7 * 4 + len(keys) * 8,  # Start of value index
+        0, 0  # Size and offset of hash table
+    )
+    output += array.array('i', koffsets).tobytes()
+    output += array.array('i', voffsets).tobytes()
+    output += ids
+    output += strs
+    return output
+
+
+def compile_file(po_file, mo_file, check=True):
+    """
+    Compiles a .po file to a .mo file.
+    """
+    with open(po_file, 'rb') as f:
+        data = compile_po(decode_po(f.read(), po_file), po_file, check=check)
+
+    with open(mo_file, 'wb') as f:
+        f.write(data)
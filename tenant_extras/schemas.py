@@ -0,0 +1,169 @@
+"""
+Creates tenant schemas by copying a template schema that is migrated and
+has its fixtures loaded, instead of running all migrations for every new
+tenant.
+
+Tables, their data, sequences, indexes and constraints are copied, under
+the names they have in the template, so later migrations that refer to
+them by name work the same on cloned schemas. Views, functions and
+triggers in the template schema are not copied.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from tenant_schemas.utils import schema_context, schema_exists
+
+
+class TemplateSchemaError(ValueError):
+    pass
+
+
+def check_template_schema(template):
+    """
+    Raises a TemplateSchemaError if the template schema does not exist, or
+    if its migrations are not the ones in the code.
+    """
+    if not schema_exists(template):
+        raise TemplateSchemaError('Template schema {} does not exist'.format(template))
+
+    with schema_context(template):
+        executor = MigrationExecutor(connection)
+        graph = executor.loader.graph
+        plan = executor.migration_plan(graph.leaf_nodes())
+        unknown = set(executor.loader.applied_migrations) - set(graph.nodes)
+
+    errors = []
+    if plan:
+        errors.append('unapplied migrations {}'.format(', '.join(
+            '{}.{}'.format(migration.app_label, migration.name) for migration, backwards in plan
+        )))
+    if unknown:
+        errors.append('migrations not in the code {}'.format(', '.join(
+            '{}.{}'.format(app_label, name) for app_label, name in sorted(unknown)
+        )))
+    if errors:
+        raise TemplateSchemaError('Template schema {} has {}'.format(template, ' and '.join(errors)))
+
+
+def _requalify(sql, template, schema):
+    """
+    Points the names qualified with the template schema in SQL to the schema.
+    """
+    pattern = r'(?<![\w"])(?:"{0}"|{0})\.'.format(re.escape(template))
+    return re.sub(pattern, lambda match: connection.ops.quote_name(schema) + '.', sql)
+
+
+def clone_schema(template, schema):
+    """
+    Creates the schema as a copy of the template schema, in one transaction.
+    """
+    qn = connection.ops.quote_name
+
+    with transaction.atomic():
+        cursor = connection.cursor()
+        # Only the public schema on the search path, so all names in the
+        # definitions below are qualified
+        cursor.execute('SET LOCAL search_path = public')
+        cursor.execute('CREATE SCHEMA {}'.format(qn(schema)))
+
+        # Sequences with the table and column that own them, if any, and
+        # their options. Identity sequences are created along with their table.
+        cursor.execute(
+            "SELECT seq.relname, tbl.relname, att.attname, dep.deptype, "
+            "format_type(pgs.seqtypid, NULL), pgs.seqincrement, pgs.seqmin, pgs.seqmax, "
+            "pgs.seqstart, pgs.seqcache, pgs.seqcycle "
+            "FROM pg_class seq "
+            "JOIN pg_namespace ns ON ns.oid = seq.relnamespace "
+            "JOIN pg_sequence pgs ON pgs.seqrelid = seq.oid "
+            "LEFT JOIN pg_depend dep ON dep.objid = seq.oid "
+            "AND dep.classid = 'pg_class'::regclass AND dep.deptype IN ('a', 'i') "
+            "LEFT JOIN pg_class tbl ON tbl.oid = dep.refobjid "
+            "LEFT JOIN pg_attribute att ON att.attrelid = dep.refobjid AND att.attnum = dep.refobjsubid "
+            "WHERE seq.relkind = 'S' AND ns.nspname = %s",
+            [template]
+        )
+        sequences = []
+        for row in cursor.fetchall():
+            sequence, table, column, deptype = row[:4]
+            sequences.append((sequence, table, column, deptype))
+            if deptype != 'i':
+                data_type, increment, minimum, maximum, start, cache, cycle = row[4:]
+                cursor.execute(
+                    'CREATE SEQUENCE {}.{} AS {} INCREMENT BY {} MINVALUE {} MAXVALUE {} '
+                    'START WITH {} CACHE {} {}'.format(
+                        qn(schema), qn(sequence), data_type, increment, minimum, maximum,
+                        start, cache, 'CYCLE' if cycle else 'NO CYCLE'))
+
+        cursor.execute(
+            "SELECT tablename FROM pg_tables WHERE schemaname = %s ORDER BY tablename",
+            [template]
+        )
+        tables = [row[0] for row in cursor.fetchall()]
+        identity_tables = set(table for sequence, table, column, deptype in sequences if deptype == 'i')
+        for table in tables:
+            # Indexes and constraints get generated names with LIKE, so they
+            # are created below with the names of the template
+            cursor.execute(
+                'CREATE TABLE {0}.{2} (LIKE {1}.{2} INCLUDING DEFAULTS INCLUDING IDENTITY '
+                'INCLUDING STORAGE INCLUDING COMMENTS)'.format(qn(schema), qn(template), qn(table)))
+
+            # Serial column defaults still use the sequences of the template
+            cursor.execute(
+                "SELECT column_name, column_default FROM information_schema.columns "
+                "WHERE table_schema = %s AND table_name = %s AND column_default LIKE 'nextval(%%'",
+                [schema, table]
+            )
+            for column, default in cursor.fetchall():
+                cursor.execute('ALTER TABLE {}.{} ALTER COLUMN {} SET DEFAULT {}'.format(
+                    qn(schema), qn(table), qn(column), _requalify(default, template, schema)))
+
+            cursor.execute('INSERT INTO {0}.{2} {3} SELECT * FROM {1}.{2}'.format(
+                qn(schema), qn(template), qn(table),
+                'OVERRIDING SYSTEM VALUE' if table in identity_tables else ''))
+
+        for sequence, table, column, deptype in sequences:
+            if deptype == 'i':
+                cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [
+                    '{}.{}'.format(qn(schema), qn(table)), column])
+                target = cursor.fetchone()[0]
+            else:
+                target = '{}.{}'.format(qn(schema), qn(sequence))
+                if deptype == 'a':
+                    cursor.execute('ALTER SEQUENCE {} OWNED BY {}.{}.{}'.format(
+                        target, qn(schema), qn(table), qn(column)))
+
+            cursor.execute('SELECT last_value, is_called FROM {}.{}'.format(qn(template), qn(sequence)))
+            last_value, is_called = cursor.fetchone()
+            cursor.execute('SELECT setval(%s, %s, %s)', [target, last_value, is_called])
+
+        # Indexes that don't belong to a constraint. The definitions name the
+        # index as in the template and the table qualified with its schema.
+        cursor.execute(
+            "SELECT pg_get_indexdef(idx.indexrelid) "
+            "FROM pg_index idx "
+            "JOIN pg_class tbl ON tbl.oid = idx.indrelid "
+            "JOIN pg_namespace ns ON ns.oid = tbl.relnamespace "
+            "WHERE ns.nspname = %s AND tbl.relkind = 'r' AND NOT EXISTS ("
+            "SELECT 1 FROM pg_constraint con WHERE con.conindid = idx.indexrelid "
+            "AND con.contype IN ('p', 'u', 'x'))",
+            [template]
+        )
+        for definition, in cursor.fetchall():
+            cursor.execute(_requalify(definition, template, schema))
+
+        # Primary keys, unique, check and exclusion constraints first, so the
+        # foreign keys can refer to them
+        cursor.execute(
+            "SELECT tbl.relname, con.conname, pg_get_constraintdef(con.oid) "
+            "FROM pg_constraint con "
+            "JOIN pg_class tbl ON tbl.oid = con.conrelid "
+            "JOIN pg_namespace ns ON ns.oid = tbl.relnamespace "
+            "WHERE ns.nspname = %s AND con.contype IN ('p', 'u', 'c', 'x', 'f') "
+            "ORDER BY con.contype = 'f', tbl.relname, con.conname",
+            [template]
+        )
+        for table, name, definition in cursor.fetchall():
+            cursor.execute('ALTER TABLE {}.{} ADD CONSTRAINT {} {}'.format(
+                qn(schema), qn(table), qn(name), _requalify(definition, template, schema)))
@@ -1,5 +1,8 @@
 from collections import OrderedDict
+import fnmatch
 import os
+import re
+import time
 
 from django.utils._os import safe_join
 
@@ -10,27 +13,38 @@ from django.contrib.staticfiles.finders import FileSystemFinder
 from django.core.files.storage import FileSystemStorage
 from django.contrib.staticfiles import utils
 
-import tenant_schemas.utils
-
 
 class TenantStaticFilesFinder(FileSystemFinder):
 
     def __init__(self, apps=None, *args, **kwargs):
+        if not isinstance(settings.MULTI_TENANT_DIR, str):
+            raise ImproperlyConfigured(
+                "You need to set the MULTI_TENANT_DIR setting")
+
+        self.refresh()
+
+        super(FileSystemFinder, self).__init__(*args, **kwargs)
+
+    def refresh(self):
+        """
+        Lists the tenant static directories again, for tenants that were
+        added or removed since the finder was created.
+        """
         # List of locations with static files
         self.locations = []
 
         # Maps dir paths to an appropriate storage instance
         self.storages = OrderedDict()
 
-        if not isinstance(settings.MULTI_TENANT_DIR, str):
-            raise ImproperlyConfigured(
-                "You need to set the MULTI_TENANT_DIR setting")
+        # Maps tenant names, the first part of static paths, to their root
+        self.index = {}
+
+        self.scanned = 0
+        self.scan_seconds = 0
 
         tenant_dir = settings.MULTI_TENANT_DIR
-        for tenant_name in [f for f in os.listdir(tenant_dir) if os.path.isdir(os.path.join(tenant_dir, f))]:
-            tenant_static_dir = os.path.join(getattr(settings, 'MULTI_TENANT_DIR', None),
-                                             tenant_name,
-                                             'static')
+        for tenant_name in sorted(f for f in os.listdir(tenant_dir) if os.path.isdir(os.path.join(tenant_dir, f))):
+            tenant_static_dir = os.path.join(tenant_dir, tenant_name, 'static')
 
             if os.path.exists(tenant_static_dir):
                 self.locations.append((tenant_name, tenant_static_dir))
@@ -39,30 +53,74 @@ class TenantStaticFilesFinder(FileSystemFinder):
             filesystem_storage = FileSystemStorage(location=root)
             filesystem_storage.prefix = prefix
             self.storages[root] = filesystem_storage
-
-        super(FileSystemFinder, self).__init__(*args, **kwargs)
+            self.index[prefix] = root
 
     def find(self, path, all=False):
         """
         Looks for files in the client static directories.
-        static/assets/greatbarier/images/logo.jpg
+        greatbarier/images/logo.jpg
         will translate to
         MULTI_TENANT_DIR/greatbarier/static/images/logo.jpg
 
         """
-        tenants = tenant_schemas.utils.get_tenant_model().objects.all()
-        tenant_dir = getattr(settings, 'MULTI_TENANT_DIR', None)
-
-        if not tenant_dir:
-            return []
-
-        for tenant in tenants:
-            if "{0}/".format(tenant.client_name) in path:
-                tenant_path = path.replace('{0}/'.format(tenant.client_name),
-                                           '{0}/static/'.format(tenant.client_name))
-                local_path = safe_join(tenant_dir, tenant_path)
-                if os.path.exists(local_path):
-                    if all:
-                        return [local_path]
-                    return local_path
+        tenant_name, _, tenant_path = path.partition('/')
+        root = self.index.get(tenant_name)
+
+        if root and tenant_path:
+            local_path = safe_join(root, tenant_path)
+            if os.path.exists(local_path):
+                if all:
+                    return [local_path]
+                return local_path
         return []
+
+    def list(self, ignore_patterns):
+        return self.scan(ignore_patterns)
+
+    def scan(self, ignore_patterns=None, tenants=None):
+        """
+        Yields the (path, storage) pairs of the static files of all tenants,
+        or the given ones, like list(), walking the directories with
+        os.scandir. The number of entries scanned and the time it took are
+        kept in `scanned` and `scan_seconds`.
+        """
+        ignore = compile_patterns(ignore_patterns)
+        self.scanned = 0
+        self.scan_seconds = 0
+
+        for prefix, root in self.locations:
+            if tenants is not None and prefix not in tenants:
+                continue
+
+            storage = self.storages[root]
+            start = time.time()
+            stack = ['']
+            while stack:
+                location = stack.pop()
+                try:
+                    entries = list(os.scandir(os.path.join(root, location)))
+                except OSError:
+                    continue
+                self.scanned += len(entries)
+
+                for entry in entries:
+                    # Like get_files(), match the basename and the path of
+                    # files, and only the basename of directories
+                    path = os.path.join(location, entry.name) if location else entry.name
+                    if entry.is_dir():
+                        if ignore is None or not ignore.match(entry.name):
+                            stack.append(path)
+                    elif ignore is None or not (ignore.match(entry.name) or ignore.match(path)):
+                        self.scan_seconds += time.time() - start
+                        yield path, storage
+                        start = time.time()
+            self.scan_seconds += time.time() - start
+
+
+def compile_patterns(patterns):
+    """
+    Returns one regex that matches any of the glob patterns, or None.
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join('(?:{})'.format(fnmatch.translate(pattern)) for pattern in patterns))
@@ -0,0 +1,205 @@
+import os
+import shutil
+import tempfile
+
+import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from tenant_extras import middleware
+from tenant_extras.catalogs import MappedCatalog, load_catalog, write_catalog
+from tenant_extras.lru import LRUCache
+from tenant_extras.pocompiler import compile_file
+
+
+class TestMappedCatalog(SimpleTestCase):
+    def setUp(self):
+        self.catalog_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.catalog_dir)
+        self.path = os.path.join(self.catalog_dir, 'nl', 'django.cat')
+
+    def test_roundtrip(self):
+        items = {
+            '': 'Content-Type: text/plain; charset=UTF-8\n',
+            'Hello': 'Hallo',
+            u'Caf\xe9': u'Caf\xe9 NL',
+            ('%d minute', 0): '%d minuut',
+            ('%d minute', 1): '%d minuten',
+        }
+        write_catalog(self.path, items.items(),
+                      plural_forms='nplurals=2; plural=(n != 1);',
+                      meta={'language': 'nl'})
+
+        catalog = load_catalog(self.path)
+
+        self.assertEqual(len(catalog), 5)
+        self.assertEqual(catalog['Hello'], 'Hallo')
+        self.assertEqual(catalog.get(u'Caf\xe9'), u'Caf\xe9 NL')
+        self.assertIn('', catalog)
+        self.assertNotIn('Goodbye', catalog)
+        self.assertIsNone(catalog.get('Goodbye'))
+        self.assertEqual(catalog.plural('%d minute', 1), '%d minuut')
+        self.assertEqual(catalog.plural('%d minute', 5), '%d minuten')
+        self.assertEqual(dict(catalog.items()), items)
+        self.assertEqual(catalog.meta['language'], 'nl')
+
+        with self.assertRaises(KeyError):
+            catalog['Goodbye']
+
+    def test_empty(self):
+        write_catalog(self.path, [])
+
+        catalog = load_catalog(self.path)
+        self.assertEqual(len(catalog), 0)
+        self.assertIsNone(catalog.get('Hello'))
+
+    def test_not_a_catalog(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(b'\x00' * 64)
+
+        with self.assertRaises(ValueError):
+            load_catalog(self.path)
+
+    def test_truncated(self):
+        write_catalog(self.path, [('Hello', 'Hallo')])
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 4)
+
+        with self.assertRaises(ValueError):
+            load_catalog(self.path)
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(8)
+
+        with self.assertRaises(ValueError):
+            load_catalog(self.path)
+
+
+class TestMappedTranslation(TestCase):
+    def setUp(self):
+        self.tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tenant_dir)
+        shutil.copytree(os.path.join(settings.PROJECT_ROOT, 'tests', 'tenants', 'tenant1'),
+                        os.path.join(self.tenant_dir, 'tenant1'))
+
+    def test_mmap_backend(self):
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir, TENANT_TRANSLATION_BACKEND='mmap'), \
+                mock.patch.object(middleware, '_tenants', LRUCache(maxsize=None)):
+            nl = middleware.tenant_translation('nl', 'tenant1')
+
+            self.assertIsInstance(nl._catalog, MappedCatalog)
+            self.assertTrue(os.path.exists(middleware.catalog_path('nl', 'tenant1')))
+            self.assertEqual(nl.gettext('Tenant Name'), 'Tenant 1 NL')
+            self.assertEqual(nl.gettext('This field is required.'), 'Dit veld is verplicht.')
+            self.assertEqual(nl.ngettext('%d minute', '%d minutes', 2), '%d minuten')
+
+            # Another process maps the existing file
+            with mock.patch.object(middleware, 'write_catalog') as write:
+                other = middleware.DjangoTranslation('nl', 'tenant1')
+
+            self.assertFalse(write.called)
+            self.assertEqual(other.gettext('Tenant Name'), 'Tenant 1 NL')
+
+    def test_merged_catalog(self):
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir), \
+                mock.patch.object(middleware, '_tenants', LRUCache(maxsize=None)):
+            path = middleware.write_merged_catalog('fr', 'tenant1')
+
+            catalog = load_catalog(path)
+            self.assertTrue(catalog.meta['merged'])
+            self.assertEqual(catalog.meta['fallback'], 'en')
+
+            fr = middleware.DjangoTranslation('fr', 'tenant1')
+
+            self.assertIsInstance(fr._catalog, MappedCatalog)
+            self.assertIsNone(fr._fallback)
+            # From the fallback language
+            self.assertEqual(fr.gettext('Tenant Name'), 'Tenant 1 EN')
+            self.assertEqual(fr.gettext('This field is required.'), 'Ce champ est obligatoire.')
+
+    def test_stale_merged_catalog(self):
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir), \
+                mock.patch.object(middleware, '_tenants', LRUCache(maxsize=None)):
+            middleware.write_merged_catalog('fr', 'tenant1')
+
+            mo_file = os.path.join(self.tenant_dir, 'tenant1', 'locale', 'en', 'LC_MESSAGES', 'django.mo')
+            os.utime(mo_file, ns=(0, os.stat(mo_file).st_mtime_ns + 10 ** 9))
+
+            fr = middleware.DjangoTranslation('fr', 'tenant1')
+            self.assertNotIsInstance(fr._catalog, MappedCatalog)
+
+    def test_merged_catalog_fallback_changed(self):
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir), \
+                mock.patch.object(middleware, '_tenants', LRUCache(maxsize=None)):
+            middleware.write_merged_catalog('fr', 'tenant1')
+
+            with mock.patch.object(middleware, 'get_tenant_properties', return_value=mock.Mock(LANGUAGE_CODE='nl')):
+                fr = middleware.DjangoTranslation('fr', 'tenant1')
+
+            self.assertNotIsInstance(fr._catalog, MappedCatalog)
+            self.assertEqual(fr._fallback.language(), 'nl')
+
+    def test_merged_catalog_watches_fallback(self):
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir, TENANT_TRANSLATION_RELOAD_INTERVAL=0), \
+                mock.patch.object(middleware, '_tenants', LRUCache(maxsize=None)):
+            middleware.write_merged_catalog('fr', 'tenant1')
+            fr = middleware.tenant_translation('fr', 'tenant1')
+            self.assertTrue(fr.merged)
+
+            mo_file = os.path.join(self.tenant_dir, 'tenant1', 'locale', 'en', 'LC_MESSAGES', 'django.mo')
+            self.assertIn(mo_file, middleware._translation_files(fr))
+
+            os.utime(mo_file, ns=(0, os.stat(mo_file).st_mtime_ns + 10 ** 9))
+            self.assertIsNot(middleware.tenant_translation('fr', 'tenant1'), fr)
+
+    def test_stale_app_catalog(self):
+        app_dir = os.path.join(self.tenant_dir, 'app')
+        mo_file = os.path.join(app_dir, 'locale', 'nl', 'LC_MESSAGES', 'django.mo')
+        os.makedirs(os.path.dirname(mo_file))
+        shutil.copy(os.path.join(self.tenant_dir, 'tenant1', 'locale', 'nl', 'LC_MESSAGES', 'django.mo'), mo_file)
+
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir, TENANT_TRANSLATION_BACKEND='mmap'), \
+                mock.patch.object(middleware.apps, 'get_app_configs', return_value=[mock.Mock(path=app_dir)]):
+            middleware.DjangoTranslation('nl', 'tenant1')
+            self.assertIsInstance(middleware.DjangoTranslation('nl', 'tenant1')._catalog, MappedCatalog)
+
+            os.utime(mo_file, ns=(0, os.stat(mo_file).st_mtime_ns + 10 ** 9))
+            with mock.patch.object(middleware, 'write_catalog'):
+                nl = middleware.DjangoTranslation('nl', 'tenant1')
+            self.assertNotIsInstance(nl._catalog, MappedCatalog)
+
+    def test_truncated_catalog_file(self):
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir, TENANT_TRANSLATION_BACKEND='mmap'):
+            middleware.DjangoTranslation('nl', 'tenant1')
+
+            path = middleware.catalog_path('nl', 'tenant1')
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) // 2)
+
+            with mock.patch.object(middleware, 'write_catalog'):
+                nl = middleware.DjangoTranslation('nl', 'tenant1')
+
+            self.assertNotIsInstance(nl._catalog, MappedCatalog)
+            self.assertEqual(nl.gettext('Tenant Name'), 'Tenant 1 NL')
+
+    def test_plural_forms_differ(self):
+        messages_dir = os.path.join(self.tenant_dir, 'tenant1', 'locale', 'nl', 'LC_MESSAGES')
+        po_file = os.path.join(messages_dir, 'django.po')
+        with open(po_file) as f:
+            po = f.read().replace('plural=(n != 1);', 'plural=(n > 1);')
+        with open(po_file, 'w') as f:
+            f.write(po)
+        compile_file(po_file, os.path.join(messages_dir, 'django.mo'))
+
+        with self.settings(MULTI_TENANT_DIR=self.tenant_dir, TENANT_TRANSLATION_BACKEND='mmap'), \
+                mock.patch.object(middleware, '_tenants', LRUCache(maxsize=None)):
+            nl = middleware.tenant_translation('nl', 'tenant1')
+
+            # The base catalog keeps its own plural function
+            self.assertNotIsInstance(nl._catalog, MappedCatalog)
+            self.assertFalse(os.path.exists(middleware.catalog_path('nl', 'tenant1')))
+            self.assertEqual(nl.ngettext('%d minute', '%d minutes', 0), '%d minuten')
+
+            self.assertIsNone(middleware.write_merged_catalog('nl', 'tenant1'))
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+
+import mock
+
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from tenant_extras.management.commands import tenant_collectstatic
+
+
+class TestTenantCollectStatic(SimpleTestCase):
+    def setUp(self):
+        self.tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tenant_dir)
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+
+        for path in ('one/static/css/site.css', 'one/static/images/logo.png', 'two/static/favicon.ico'):
+            self._write(path, path)
+
+        overrides = override_settings(
+            MULTI_TENANT_DIR=self.tenant_dir,
+            STATIC_ROOT=self.static_root,
+            STATIC_URL='/static/',
+            STATICFILES_FINDERS=['tenant_extras.staticfiles_finders.TenantStaticFilesFinder'],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        finders.get_finder.cache_clear()
+        self.addCleanup(finders.get_finder.cache_clear)
+
+    def _write(self, path, content):
+        path = os.path.join(self.tenant_dir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _collect(self, **options):
+        with mock.patch.object(tenant_collectstatic.Command, 'copy_file', autospec=True,
+                               side_effect=tenant_collectstatic.Command.copy_file) as copy_file:
+            call_command('tenant_collectstatic', interactive=False, verbosity=0, stdout=StringIO(),
+                         use_default_ignore_patterns=False, **options)
+        return sorted(args[2] for args, kwargs in copy_file.call_args_list)
+
+    def test_collect(self):
+        self.assertEqual(
+            self._collect(jobs=2),
+            [os.path.join('one', 'css', 'site.css'), os.path.join('one', 'images', 'logo.png'),
+             os.path.join('two', 'favicon.ico')]
+        )
+        with open(os.path.join(self.static_root, 'one', 'css', 'site.css')) as f:
+            self.assertEqual(f.read(), 'one/static/css/site.css')
+
+    def test_incremental(self):
+        self._collect()
+        self.assertEqual(self._collect(jobs=2), [])
+
+        # Touched, but not changed
+        path = os.path.join(self.tenant_dir, 'two', 'static', 'favicon.ico')
+        os.utime(path, (0, os.stat(path).st_mtime + 10))
+        self.assertEqual(self._collect(), [])
+
+        self._write('one/static/css/site.css', 'body {}')
+        path = os.path.join(self.tenant_dir, 'one', 'static', 'css', 'site.css')
+        os.utime(path, (0, os.stat(path).st_mtime + 10))
+        self.assertEqual(self._collect(), [os.path.join('one', 'css', 'site.css')])
+        with open(os.path.join(self.static_root, 'one', 'css', 'site.css')) as f:
+            self.assertEqual(f.read(), 'body {}')
+
+        # Cleared destinations are collected again
+        self.assertEqual(len(self._collect(clear=True)), 3)
+
+    def test_tenant(self):
+        self.assertEqual(self._collect(tenant='two'), [os.path.join('two', 'favicon.ico')])
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, 'one')))
+
+        self.assertEqual(self._collect(tenant='two', clear=True), [os.path.join('two', 'favicon.ico')])
+        self.assertEqual(len(self._collect()), 2)
+
+        with self.assertRaisesRegex(CommandError, 'three'):
+            self._collect(tenant='three')
+
+    def test_dedup(self):
+        self._write('one/static/js/jquery.js', 'jQuery')
+        self._write('two/static/js/jquery.js', 'jQuery')
+        stdout = StringIO()
+        call_command('tenant_collectstatic', interactive=False, verbosity=1, stdout=stdout,
+                     use_default_ignore_patterns=False, dedup='hardlink', jobs=2)
+
+        one = os.stat(os.path.join(self.static_root, 'one', 'js', 'jquery.js'))
+        two = os.stat(os.path.join(self.static_root, 'two', 'js', 'jquery.js'))
+        self.assertEqual((one.st_ino, one.st_nlink), (two.st_ino, 3))
+        self.assertIn('Stored 5 tenant files as 4 blobs, 6 bytes saved', stdout.getvalue())
+
+        # Changed files get their own blob
+        self._write('two/static/js/jquery.js', 'jQuery 3')
+        self.assertEqual(self._collect(dedup='hardlink'), [])
+        with open(os.path.join(self.static_root, 'two', 'js', 'jquery.js')) as f:
+            self.assertEqual(f.read(), 'jQuery 3')
+        with open(os.path.join(self.static_root, 'one', 'js', 'jquery.js')) as f:
+            self.assertEqual(f.read(), 'jQuery')
+
+        # The blob of the old content is still used by one, the blob of
+        # removed files is deleted
+        os.remove(os.path.join(self.tenant_dir, 'one', 'static', 'js', 'jquery.js'))
+        self._collect(dedup='hardlink')
+        blobs = [name for path, dirs, names in os.walk(os.path.join(self.static_root, '.blobs')) for name in names]
+        self.assertEqual(len(blobs), 4)
+        self.assertNotIn(hashlib.sha1(b'jQuery').hexdigest(), blobs)
+        self.assertIn(hashlib.sha1(b'jQuery 3').hexdigest(), blobs)
+
+    def test_dedup_symlink(self):
+        self._write('one/static/js/jquery.js', 'jQuery')
+        self._write('two/static/js/jquery.js', 'jQuery')
+        self._collect(dedup='symlink')
+
+        one = os.path.join(self.static_root, 'one', 'js', 'jquery.js')
+        two = os.path.join(self.static_root, 'two', 'js', 'jquery.js')
+        self.assertTrue(os.path.islink(one))
+        self.assertEqual(os.path.realpath(one), os.path.realpath(two))
+        with open(two) as f:
+            self.assertEqual(f.read(), 'jQuery')
+
+    def test_dedup_link(self):
+        with self.assertRaisesRegex(CommandError, 'dedup'):
+            self._collect(dedup='hardlink', link=True)
+
+    def _manifest(self):
+        with open(os.path.join(self.static_root, tenant_collectstatic.MANIFEST_FILE)) as f:
+            return sorted(json.load(f)['files'])
+
+    def test_manifest_pruned(self):
+        self._collect()
+        self.assertEqual(len(self._manifest()), 3)
+        self.assertFalse(os.path.exists(os.path.join(self.tenant_dir, tenant_collectstatic.MANIFEST_FILE)))
+
+        os.remove(os.path.join(self.tenant_dir, 'one', 'static', 'images', 'logo.png'))
+        os.remove(os.path.join(self.tenant_dir, 'two', 'static', 'favicon.ico'))
+
+        # Other tenants are kept with --tenant
+        self._collect(tenant='one')
+        self.assertEqual(self._manifest(), [os.path.join('one', 'css', 'site.css'), os.path.join('two', 'favicon.ico')])
+
+        self._collect()
+        self.assertEqual(self._manifest(), [os.path.join('one', 'css', 'site.css')])
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+
+import mock
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase
+
+from tenant_extras.management.commands import compilepo
+
+
+class TestCompile(SimpleTestCase):
+    def setUp(self):
+        self.basedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.basedir)
+
+        for locale in ('en', 'nl'):
+            os.makedirs(os.path.join(self.basedir, locale, 'LC_MESSAGES'))
+            with open(os.path.join(self.basedir, locale, 'LC_MESSAGES', 'django.po'), 'w') as f:
+                f.write('msgid ""\nmsgstr ""\n')
+
+        self.files = list(compilepo._find_po_files(None, self.basedir))
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        cache_settings = self.settings(TENANT_EXTRAS_CACHE_DIR=self.cache_dir)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+    def _compile(self, **kwargs):
+        def msgfmt(args):
+            open(args[3], 'w').close()
+            return '', '', 0
+
+        with mock.patch.object(compilepo, 'popen_wrapper', side_effect=msgfmt) as popen:
+            result = compilepo._compile(StringIO(), self.files, 'msgfmt', **kwargs)
+        return result, popen
+
+    def test_compile(self):
+        (compiled, skipped, failed, seconds), popen = self._compile(jobs=2)
+
+        self.assertEqual((compiled, skipped, failed), (2, 0, []))
+        self.assertEqual(popen.call_count, 2)
+
+    def test_incremental(self):
+        self._compile(incremental=True)
+        self.assertEqual(os.listdir(os.path.join(self.cache_dir, 'compilepo')),
+                         [os.path.basename(compilepo._hashes_path(self.basedir))])
+        self.assertEqual(sorted(os.listdir(self.basedir)), ['en', 'nl'])
+
+        (compiled, skipped, failed, seconds), popen = self._compile(incremental=True)
+        self.assertEqual((compiled, skipped), (0, 2))
+
+        # Touched, but not changed
+        po_file = os.path.join(self.basedir, 'nl', 'LC_MESSAGES', 'django.po')
+        os.utime(po_file, (0, os.stat(po_file).st_mtime + 10))
+        (compiled, skipped, failed, seconds), popen = self._compile(incremental=True)
+        self.assertEqual((compiled, skipped), (0, 2))
+
+        with open(po_file, 'a') as f:
+            f.write('\nmsgid "Hello"\nmsgstr "Hallo"\n')
+        os.utime(po_file, (0, os.stat(po_file).st_mtime + 20))
+        (compiled, skipped, failed, seconds), popen = self._compile(incremental=True)
+        self.assertEqual((compiled, skipped), (1, 1))
+
+    def test_failed(self):
+        with mock.patch.object(compilepo, 'popen_wrapper', return_value=('', 'bad format', 1)):
+            compiled, skipped, failed, seconds = compilepo._compile(StringIO(), self.files, 'msgfmt')
+
+        self.assertEqual(compiled, 0)
+        self.assertEqual(len(failed), 2)
+        self.assertIn('bad format', failed[0])
+
+    def test_python_backend(self):
+        compiled, skipped, failed, seconds = compilepo._compile(
+            StringIO(), self.files, 'pocompiler', jobs=2, backend='python')
+
+        self.assertEqual((compiled, skipped, failed), (2, 0, []))
+        for basedir, po_file in self.files:
+            self.assertTrue(os.path.exists(os.path.splitext(po_file)[0] + '.mo'))
+
+    def test_python_backend_failed(self):
+        with open(self.files[0][1], 'a') as f:
+            f.write('msgid "Hello\n')
+
+        compiled, skipped, failed, seconds = compilepo._compile(
+            StringIO(), self.files, 'pocompiler', backend='python')
+
+        self.assertEqual(compiled, 1)
+        self.assertIn('invalid string', failed[0])
+
+    def test_python_backend_wrong_charset(self):
+        with open(self.files[0][1], 'w', encoding='utf-8') as f:
+            f.write('msgid ""\nmsgstr "Content-Type: text/plain; charset=ASCII\\n"\n\n'
+                    'msgid "Hello"\nmsgstr "Cześć"\n')
+
+        compiled, skipped, failed, seconds = compilepo._compile(
+            StringIO(), self.files, 'pocompiler', backend='python')
+
+        self.assertEqual(compiled, 1)
+        self.assertIn('not valid ASCII', failed[0])
+
+
+class TestMerge(SimpleTestCase):
+    def test_public_schema_after_merge(self):
+        tenant = mock.Mock(client_name='tenant1')
+        tenant_model = mock.Mock()
+        tenant_model.objects.filter.return_value = [tenant]
+
+        with mock.patch('tenant_schemas.utils.get_tenant_model', return_value=tenant_model), \
+                mock.patch('tenant_extras.middleware.write_merged_catalog', return_value='django.cat'), \
+                mock.patch.object(compilepo, 'activate_tenant') as activate, \
+                mock.patch.object(compilepo, 'connection') as connection:
+            compilepo.merge_catalogs(StringIO(), locale=['nl'], tenant='tenant1')
+
+        activate.assert_called_once_with(tenant)
+        connection.set_schema_to_public.assert_called_once_with()
+
+    def test_tenant_without_row(self):
+        tenant = mock.Mock(client_name='tenant1')
+        tenant_model = mock.Mock()
+        tenant_model.objects.filter.return_value = [tenant]
+        events = []
+        stdout = StringIO()
+
+        with mock.patch('tenant_schemas.utils.get_tenant_model', return_value=tenant_model), \
+                mock.patch('tenant_extras.middleware.write_merged_catalog',
+                           side_effect=lambda language, tenant_name: events.append(tenant_name)), \
+                mock.patch.object(compilepo, 'get_tenant_names', return_value=['tenant1', 'tenant2']), \
+                mock.patch.object(compilepo, 'activate_tenant', side_effect=lambda t: events.append('activate')), \
+                mock.patch.object(compilepo, 'connection'):
+            compilepo.merge_catalogs(stdout, locale=['nl'])
+
+        # Not with the properties of tenant1
+        self.assertEqual(events, ['tenant2', 'activate', 'tenant1'])
+        self.assertIn('No tenant found for tenant2', stdout.getvalue())
+
+    def test_plural_forms_differ(self):
+        stdout = StringIO()
+
+        with mock.patch('tenant_schemas.utils.get_tenant_model', side_effect=DatabaseError), \
+                mock.patch('tenant_extras.middleware.write_merged_catalog', return_value=None):
+            compilepo.merge_catalogs(stdout, locale=['nl'], tenant='tenant1')
+
+        self.assertIn('skipped catalog of tenant1 for nl', stdout.getvalue())
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+
+import mock
+
+from django.core import exceptions
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from tenant_extras.management.commands import create_tenant
+
+
+class FakeTenantModel(object):
+    """
+    Stands in for the tenant model, validating the schema name like
+    tenant_schemas does.
+    """
+    DoesNotExist = Exception
+    created = []
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def full_clean(self):
+        if not self.schema_name.replace('_', '').isalnum():
+            raise exceptions.ValidationError('Invalid string used for the schema name.')
+
+    def save(self):
+        pass
+
+    class objects(object):
+        @staticmethod
+        def create(**kwargs):
+            if kwargs['client_name'] == 'broken':
+                raise Exception('Could not create schema')
+            tenant = FakeTenantModel(**kwargs)
+            FakeTenantModel.created.append(tenant)
+            return tenant
+
+        @staticmethod
+        def get(client_name):
+            return [t for t in FakeTenantModel.created if t.client_name == client_name][0]
+
+
+class TestCreateFromFile(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        FakeTenantModel.created = []
+
+    def _write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _create(self, path, template_schema=None, jobs=1, **options):
+        command = create_tenant.Command(stdout=StringIO(), stderr=StringIO())
+        with mock.patch.object(create_tenant, 'get_tenant_model', return_value=FakeTenantModel), \
+                mock.patch.object(create_tenant, 'connection'), \
+                mock.patch.object(create_tenant, 'call_command') as call_command:
+            try:
+                command.handle(from_file=path, jobs=jobs, template_schema=template_schema, **options)
+            finally:
+                self.stdout = command.stdout._out.getvalue()
+                self.stderr = command.stderr._out.getvalue()
+        return call_command
+
+    def test_csv(self):
+        path = self._write('tenants.csv', 'full_name,client_name,domain_url\nOne Tenant,,\nTwo,second,two.example.com\n')
+        call_command = self._create(path)
+
+        self.assertEqual(
+            sorted((t.name, t.client_name, t.schema_name, t.domain_url) for t in FakeTenantModel.created),
+            [('One Tenant', 'one-tenant', 'one_tenant', 'one-tenant.localhost'),
+             ('Two', 'second', 'second', 'two.example.com')]
+        )
+        # All fixtures in one call per tenant
+        self.assertEqual(call_command.call_args_list, [mock.call('loaddata', *create_tenant.FIXTURES)] * 2)
+        self.assertIn('Created 2 of 2 tenants', self.stdout)
+
+    def test_json(self):
+        path = self._write('tenants.json', json.dumps([{'full_name': 'One'}, {'full_name': 'Broken'}]))
+
+        with self.assertRaisesRegex(CommandError, 'broken'):
+            self._create(path)
+
+        self.assertEqual([t.client_name for t in FakeTenantModel.created], ['one'])
+        self.assertIn('Failed to create broken', self.stderr)
+        self.assertIn('Created 1 of 2 tenants', self.stdout)
+
+    def test_parallel(self):
+        path = self._write('tenants.json', json.dumps([
+            {'full_name': 'One'}, {'full_name': 'Broken'}, {'full_name': 'Three'}
+        ]))
+
+        with self.assertRaisesRegex(CommandError, 'broken'):
+            self._create(path, jobs=2)
+
+        # Created in worker processes
+        self.assertIn('Created one in', self.stdout)
+        self.assertIn('Created three in', self.stdout)
+        self.assertIn('Failed to create broken', self.stderr)
+        self.assertIn('Created 2 of 3 tenants', self.stdout)
+
+    def test_post_command(self):
+        path = self._write('tenants.json', json.dumps([{'full_name': 'One'}]))
+
+        with self.assertRaisesRegex(CommandError, 'post-command'):
+            self._create(path, post_command='rebuild_index')
+        self.assertEqual(FakeTenantModel.created, [])
+
+    def test_invalid(self):
+        path = self._write('tenants.json', json.dumps([
+            {'full_name': 'One'}, {'full_name': ''}, {'full_name': 'One', 'schema_name': 'one$'}
+        ]))
+
+        with self.assertRaises(CommandError) as cm:
+            self._create(path)
+
+        self.assertEqual(str(cm.exception).split('\n'), [
+            'Row 2: full_name is required',
+            'Row 3: client_name one is also used in row 1',
+            'Row 3: domain_url one.localhost is also used in row 1',
+            'Row 3: Invalid string used for the schema name.',
+        ])
+        self.assertEqual(FakeTenantModel.created, [])
+
+    @mock.patch.object(create_tenant, 'post_schema_sync')
+    @mock.patch.object(create_tenant, 'clone_schema')
+    @mock.patch.object(create_tenant, 'check_template_schema')
+    def test_template_schema(self, check_template_schema, clone_schema, post_schema_sync):
+        path = self._write('tenants.json', json.dumps([{'full_name': 'One'}, {'full_name': 'Two'}]))
+
+        with mock.patch.object(FakeTenantModel, 'save', autospec=True) as save, \
+                mock.patch.object(create_tenant.transaction, 'atomic'):
+            call_command = self._create(path, template_schema='template')
+
+        check_template_schema.assert_called_once_with('template')
+        self.assertEqual(sorted(clone_schema.call_args_list), [
+            mock.call('template', 'one'), mock.call('template', 'two')
+        ])
+        self.assertEqual(save.call_count, 2)
+        self.assertEqual([args[0].auto_create_schema for args, kwargs in save.call_args_list], [False, False])
+        self.assertEqual(post_schema_sync.send.call_count, 2)
+        # The template already has the fixtures
+        self.assertEqual(call_command.call_count, 0)
+
+    @mock.patch.object(create_tenant, 'check_template_schema',
+                       side_effect=create_tenant.TemplateSchemaError('Template schema template has unapplied migrations'))
+    def test_template_schema_outdated(self, check_template_schema):
+        path = self._write('tenants.json', json.dumps([{'full_name': 'One'}]))
+
+        with self.assertRaisesRegex(CommandError, 'unapplied migrations'):
+            self._create(path, template_schema='template')
+        self.assertEqual(FakeTenantModel.created, [])
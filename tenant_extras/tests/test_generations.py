@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+
+import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from tenant_extras import generations, middleware
+from tenant_extras.lru import LRUCache
+from tenant_extras.utils import get_tenant_properties_version
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    TENANT_GENERATIONS={
+        'BACKEND': 'tenant_extras.generations.CacheGenerationBackend',
+        'INTERVAL': 0,
+    }
+)
+class TestCacheGenerationBackend(TestCase):
+    def setUp(self):
+        generations.get_generation_backend().cache.clear()
+
+    def test_change_invalidates(self):
+        version = get_tenant_properties_version('tenant1')
+        self.assertEqual(get_tenant_properties_version('tenant1'), version)
+
+        # Another worker changes the tenant
+        generations.get_generation_backend().bump('tenant1')
+        self.assertEqual(get_tenant_properties_version('tenant1'), version + 1)
+
+    @mock.patch.object(middleware, '_tenants', LRUCache(maxsize=None))
+    def test_translations_dropped(self):
+        generations.check_tenant_generation('tenant1')
+        middleware._tenants.set(('tenant1', 'en'), mock.Mock())
+        middleware._tenants.set(('tenant1', 'nl'), mock.Mock())
+        middleware._tenants.set(('tenant2', 'en'), mock.Mock())
+
+        generations.get_generation_backend().bump('tenant1')
+        generations.check_tenant_generation('tenant1')
+
+        self.assertEqual(middleware._tenants.keys(), [('tenant2', 'en')])
+
+    def test_bump_is_local(self):
+        version = get_tenant_properties_version('tenant1')
+        generations.bump_tenant_generation('tenant1')
+
+        self.assertEqual(get_tenant_properties_version('tenant1'), version + 1)
+
+
+class TestFileGenerationBackend(TestCase):
+    def setUp(self):
+        self.tenant_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tenant_dir, 'tenant1'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tenant_dir)
+
+    def test_stamp(self):
+        with override_settings(MULTI_TENANT_DIR=self.tenant_dir):
+            backend = generations.FileGenerationBackend()
+            self.assertEqual(backend.get('tenant1'), 0)
+
+            generation = backend.bump('tenant1')
+            self.assertTrue(generation)
+            self.assertEqual(backend.get('tenant1'), generation)
+
+    def test_interval(self):
+        with override_settings(MULTI_TENANT_DIR=self.tenant_dir,
+                               TENANT_GENERATIONS={
+                                   'BACKEND': 'tenant_extras.generations.FileGenerationBackend',
+                                   'INTERVAL': 60,
+                               }):
+            with mock.patch.object(generations.FileGenerationBackend, 'get',
+                                   return_value=1) as get:
+                generations.check_tenant_generation('tenant1')
+                generations.check_tenant_generation('tenant1')
+
+            self.assertEqual(get.call_count, 1)
@@ -0,0 +1,58 @@
+from django.test import SimpleTestCase
+
+from tenant_extras.lru import LRUCache
+
+
+class TestLRUCache(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.keys(), ['a', 'c'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_evicts_by_weight(self):
+        cache = LRUCache(maxsize=None, maxweight=10, weigher=len)
+        cache.set('a', 'x' * 6)
+        cache.set('b', 'x' * 4)
+        self.assertEqual(len(cache), 2)
+
+        cache.set('c', 'x' * 3)
+        self.assertEqual(cache.keys(), ['b', 'c'])
+        self.assertEqual(cache.weight, 7)
+
+    def test_keeps_heavy_entry(self):
+        cache = LRUCache(maxsize=None, maxweight=2, weigher=len)
+        cache.set('a', 'xxx')
+
+        self.assertEqual(cache.get('a'), 'xxx')
+
+    def test_stats(self):
+        cache = LRUCache(maxsize=1, weigher=len)
+        cache.set('a', 'xx')
+        cache.get('a')
+        cache.get('b')
+        cache.set('b', 'x')
+
+        self.assertEqual(cache.stats(), {
+            'entries': 1, 'weight': 1, 'hits': 1, 'misses': 1, 'evictions': 1
+        })
+
+    def test_resize(self):
+        cache = LRUCache(maxsize=None)
+        for key in 'abc':
+            cache.set(key, key)
+
+        cache.resize(maxsize=1)
+        self.assertEqual(cache.keys(), ['c'])
+
+    def test_pop(self):
+        cache = LRUCache(weigher=len)
+        cache.set('a', 'xx')
+
+        self.assertEqual(cache.pop('a'), 'xx')
+        self.assertEqual(cache.weight, 0)
+        self.assertIsNone(cache.get('a'))
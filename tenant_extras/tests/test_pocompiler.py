@@ -0,0 +1,147 @@
+import gettext
+import io
+import os
+import warnings
+
+from django.conf import settings
+from django.contrib import humanize
+from django.test import SimpleTestCase
+
+from tenant_extras.pocompiler import PoFileError, compile_po, decode_po, parse_po
+
+PO_FILE = u'''# Translation file
+msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+"Plural-Forms: nplurals=2; plural=(n != 1);\\n"
+
+#: views.py:1
+msgid "Hello"
+msgstr "Hallo"
+
+#, python-format
+msgid "Hello %(name)s"
+msgstr ""
+"Hallo "
+"%(name)s"
+
+msgctxt "month"
+msgid "May"
+msgstr "mei"
+
+#, python-format
+msgid "%d minute"
+msgid_plural "%d minutes"
+msgstr[0] "een minuut"
+msgstr[1] "%d minuten"
+
+#, fuzzy
+msgid "Fuzzy"
+msgstr "Wazig"
+
+msgid "Untranslated"
+msgstr ""
+
+msgid "Quote \\"this\\""
+msgstr "Citeer \\"dit\\"\\n"
+
+#~ msgid "Obsolete"
+#~ msgstr "Verouderd"
+'''
+
+
+class TestPoCompiler(SimpleTestCase):
+    def _translations(self, data):
+        return gettext.GNUTranslations(io.BytesIO(data))
+
+    def test_compile(self):
+        translations = self._translations(compile_po(PO_FILE.splitlines()))
+
+        self.assertEqual(translations.gettext('Hello'), 'Hallo')
+        self.assertEqual(translations.gettext('Hello %(name)s'), 'Hallo %(name)s')
+        self.assertEqual(translations.pgettext('month', 'May'), 'mei')
+        self.assertEqual(translations.ngettext('%d minute', '%d minutes', 1), 'een minuut')
+        self.assertEqual(translations.ngettext('%d minute', '%d minutes', 3), '%d minuten')
+        self.assertEqual(translations.gettext('Quote "this"'), 'Citeer "dit"\n')
+        self.assertEqual(translations.gettext('Fuzzy'), 'Fuzzy')
+        self.assertEqual(translations.gettext('Untranslated'), 'Untranslated')
+        self.assertEqual(translations.gettext('Obsolete'), 'Obsolete')
+
+    def test_same_as_msgfmt(self):
+        locale_dir = os.path.join(settings.PROJECT_ROOT, 'tests', 'tenants', 'tenant1',
+                                  'locale', 'nl', 'LC_MESSAGES')
+        with io.open(os.path.join(locale_dir, 'django.po'), encoding='utf-8') as f:
+            compiled = self._translations(compile_po(f))
+        with open(os.path.join(locale_dir, 'django.mo'), 'rb') as f:
+            expected = gettext.GNUTranslations(f)
+
+        self.assertEqual(compiled._catalog, expected._catalog)
+
+    def test_check_format(self):
+        po_file = [
+            '#, python-format',
+            'msgid "Hello %(name)s"',
+            'msgstr "Hallo %(naam)s"',
+        ]
+        with self.assertRaises(PoFileError) as e:
+            compile_po(po_file, 'django.po')
+        self.assertIn("django.po:2: msgstr[0]: format specification '%(naam)s'", str(e.exception))
+
+        # Without checking
+        compile_po(po_file, check=False)
+
+    def test_check_plural_format(self):
+        # The singular form of Croatian uses the count of msgid_plural
+        locale_dir = os.path.join(os.path.dirname(humanize.__file__), 'locale', 'hr', 'LC_MESSAGES')
+        with open(os.path.join(locale_dir, 'django.po'), 'rb') as f:
+            compiled = self._translations(compile_po(decode_po(f.read(), 'django.po'), 'django.po'))
+        with open(os.path.join(locale_dir, 'django.mo'), 'rb') as f:
+            expected = gettext.GNUTranslations(f)
+
+        self.assertEqual(compiled._catalog, expected._catalog)
+        self.assertEqual(compiled.ngettext('a second ago', '%(count)s seconds ago', 1), 'prije %(count)s sekunde')
+
+        with self.assertRaises(PoFileError):
+            compile_po([
+                '#, python-format',
+                'msgid "a second ago"',
+                'msgid_plural "%(count)s seconds ago"',
+                'msgstr[0] "prije %(broj)s sekunde"',
+                'msgstr[1] "prije %(count)s sekundi"',
+            ])
+
+    def test_check_brace_format(self):
+        with self.assertRaises(PoFileError):
+            compile_po([
+                '#, python-brace-format',
+                'msgid "Hello {name}"',
+                'msgstr "Hallo {naam}"',
+            ])
+
+    def test_charset(self):
+        po_file = PO_FILE.replace('charset=UTF-8', 'charset=ISO-8859-1').replace('Hallo', 'H\xe9llo')
+        translations = self._translations(compile_po(decode_po(po_file.encode('latin-1'))))
+        self.assertEqual(translations.gettext('Hello'), 'H\xe9llo')
+
+        with self.assertRaises(PoFileError):
+            decode_po(PO_FILE.replace('Hallo', 'H\xe9llo').encode('latin-1'), 'django.po')
+
+    def test_charset_placeholder(self):
+        po_file = PO_FILE.replace('charset=UTF-8', 'charset=CHARSET').replace('Hallo', 'H\xe9llo')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            lines = decode_po(po_file.encode('utf-8'), 'django.po')
+            translations = self._translations(compile_po(lines, 'django.po'))
+
+        self.assertEqual(translations.gettext('Hello'), 'H\xe9llo')
+        self.assertIn('django.po: unknown charset CHARSET, using utf-8', str(caught[0].message))
+
+    def test_not_encodable(self):
+        po_file = PO_FILE.replace('charset=UTF-8', 'charset=ISO-8859-1').replace('Hallo', 'Cze\u015b\u0107')
+        with self.assertRaises(PoFileError) as e:
+            compile_po(po_file.splitlines(), 'django.po')
+        self.assertIn('can not be encoded as ISO-8859-1', str(e.exception))
+
+    def test_invalid(self):
+        with self.assertRaises(PoFileError):
+            parse_po(['msgid "Hello'])
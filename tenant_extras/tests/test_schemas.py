@@ -0,0 +1,114 @@
+import unittest
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from tenant_extras.schemas import TemplateSchemaError, _requalify, check_template_schema, clone_schema
+
+
+class TestRequalify(SimpleTestCase):
+    def test_requalify(self):
+        self.assertEqual(
+            _requalify("nextval('template.seq'::regclass)", 'template', 'new'),
+            "nextval('\"new\".seq'::regclass)"
+        )
+        self.assertEqual(
+            _requalify('FOREIGN KEY (a) REFERENCES "template".b(id), public.c, my_template.d', 'template', 'new'),
+            'FOREIGN KEY (a) REFERENCES "new".b(id), public.c, my_template.d'
+        )
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Cloning schemas needs PostgreSQL')
+class TestCloneSchema(TransactionTestCase):
+    def setUp(self):
+        cursor = connection.cursor()
+        cursor.execute('CREATE SCHEMA clone_template')
+        cursor.execute(
+            'CREATE TABLE clone_template.parent ('
+            'id serial CONSTRAINT parent_pkey_named PRIMARY KEY, '
+            'name text CONSTRAINT parent_name_a1b2c3_uniq UNIQUE, '
+            'CONSTRAINT parent_name_check CHECK (name <> \'\'))'
+        )
+        cursor.execute(
+            'CREATE TABLE clone_template.child ('
+            'id integer GENERATED ALWAYS AS IDENTITY PRIMARY KEY, '
+            'parent_id integer CONSTRAINT child_parent_id_fk REFERENCES clone_template.parent (id))'
+        )
+        cursor.execute('CREATE INDEX child_parent_id_d4e5f6_idx ON clone_template.child (parent_id)')
+        cursor.execute(
+            'CREATE SEQUENCE clone_template.counter AS smallint INCREMENT BY 5 '
+            'MINVALUE 10 MAXVALUE 1000 START WITH 20 CACHE 3 CYCLE'
+        )
+        cursor.execute("INSERT INTO clone_template.parent (name) VALUES ('one'), ('two')")
+        cursor.execute('INSERT INTO clone_template.child (parent_id) VALUES (1), (2)')
+
+    def _names(self, schema):
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT tbl.relname, con.conname, con.contype FROM pg_constraint con "
+            "JOIN pg_class tbl ON tbl.oid = con.conrelid "
+            "JOIN pg_namespace ns ON ns.oid = tbl.relnamespace "
+            "WHERE ns.nspname = %s AND con.contype IN ('p', 'u', 'c', 'x', 'f') ORDER BY 1, 2",
+            [schema]
+        )
+        constraints = cursor.fetchall()
+        cursor.execute("SELECT tablename, indexname FROM pg_indexes WHERE schemaname = %s ORDER BY 1, 2", [schema])
+        return constraints, cursor.fetchall()
+
+    def _sequence_options(self, schema, sequence):
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT data_type, start_value, minimum_value, maximum_value, increment, cycle_option "
+            "FROM information_schema.sequences WHERE sequence_schema = %s AND sequence_name = %s",
+            [schema, sequence]
+        )
+        options = cursor.fetchone()
+        cursor.execute(
+            "SELECT seqcache FROM pg_sequence WHERE seqrelid = %s::regclass",
+            ['{}.{}'.format(schema, sequence)]
+        )
+        return options + cursor.fetchone()
+
+    def tearDown(self):
+        cursor = connection.cursor()
+        cursor.execute('DROP SCHEMA IF EXISTS clone_template CASCADE')
+        cursor.execute('DROP SCHEMA IF EXISTS clone_copy CASCADE')
+
+    def test_clone(self):
+        clone_schema('clone_template', 'clone_copy')
+
+        # Indexes and constraints keep their names
+        self.assertEqual(self._names('clone_copy'), self._names('clone_template'))
+        self.assertIn(('child', 'child_parent_id_d4e5f6_idx'), self._names('clone_copy')[1])
+
+        cursor = connection.cursor()
+        cursor.execute('SELECT name FROM clone_copy.parent ORDER BY id')
+        self.assertEqual(cursor.fetchall(), [('one',), ('two',)])
+
+        # Sequences continue where the template left off
+        cursor.execute("INSERT INTO clone_copy.parent (name) VALUES ('three') RETURNING id")
+        self.assertEqual(cursor.fetchone(), (3,))
+        cursor.execute('INSERT INTO clone_copy.child (parent_id) VALUES (3) RETURNING id')
+        self.assertEqual(cursor.fetchone(), (3,))
+
+        # Sequences keep their type and options
+        self.assertEqual(
+            self._sequence_options('clone_copy', 'counter'),
+            ('smallint', '20', '10', '1000', '5', 'YES', 3)
+        )
+        self.assertEqual(
+            self._sequence_options('clone_copy', 'counter'),
+            self._sequence_options('clone_template', 'counter')
+        )
+        cursor.execute("SELECT nextval('clone_copy.counter')")
+        self.assertEqual(cursor.fetchone(), (20,))
+
+        # The foreign keys point to the copy
+        cursor.execute('DELETE FROM clone_template.child')
+        cursor.execute('DELETE FROM clone_template.parent')
+        with self.assertRaises(Exception):
+            cursor.execute('INSERT INTO clone_copy.child (parent_id) VALUES (4)')
+
+    def test_check_missing(self):
+        with self.assertRaisesRegex(TemplateSchemaError, 'does not exist'):
+            check_template_schema('clone_missing')
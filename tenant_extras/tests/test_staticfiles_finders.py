@@ -1,4 +1,8 @@
 import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.finders import FileSystemFinder
 from django.test import TestCase
 from django.test.utils import override_settings
 import mock
@@ -38,3 +42,57 @@ class TestStaticFilesFinder(TestCase):
             result = self.finder.find('tenant1/does-not-exist.txt')
 
         self.assertFalse(result)
+
+    def test_find_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.finder.find('tenant1/test.txt', all=True),
+                [os.path.join(os.path.dirname(__file__), 'tenants', 'tenant1', 'static', 'test.txt')]
+            )
+
+    def test_find_other_tenant(self):
+        self.assertFalse(self.finder.find('unknown/test.txt'))
+        self.assertFalse(self.finder.find('tenant1'))
+
+    def test_refresh(self):
+        with mock.patch('os.listdir', return_value=['tenant2']):
+            self.finder.refresh()
+
+        self.assertFalse(self.finder.find('tenant1/test.txt'))
+        self.assertEqual([prefix for prefix, root in self.finder.locations], ['tenant2'])
+
+        self.finder.refresh()
+        self.assertTrue(self.finder.find('tenant1/test.txt'))
+
+
+class TestScan(TestCase):
+    def setUp(self):
+        self.tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tenant_dir)
+
+        for path in ('one/static/css/site.css', 'one/static/css/site.css.orig', 'one/static/.hidden/x.js',
+                     'one/static/images/logo.png', 'one/static/CVS/entries', 'two/static/favicon.ico',
+                     'three/templates/base.html'):
+            path = os.path.join(self.tenant_dir, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+        with override_settings(MULTI_TENANT_DIR=self.tenant_dir):
+            self.finder = TenantStaticFilesFinder()
+
+    def test_scan(self):
+        ignore_patterns = ['CVS', '.*', '*~', '*.orig', 'images/*.png']
+        files = sorted((storage.prefix, path) for path, storage in self.finder.scan(ignore_patterns))
+
+        self.assertEqual(files, [('one', os.path.join('css', 'site.css')), ('two', 'favicon.ico')])
+        # Same as the storage based listing
+        self.assertEqual(
+            files,
+            sorted((storage.prefix, path) for path, storage in FileSystemFinder.list(self.finder, ignore_patterns))
+        )
+        self.assertEqual(self.finder.scanned, 8)
+        self.assertTrue(self.finder.scan_seconds >= 0)
+
+    def test_scan_without_patterns(self):
+        self.assertEqual(len(list(self.finder.list([]))), 6)
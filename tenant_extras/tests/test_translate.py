@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+
+import mock
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from tenant_extras.management.commands import translate
+
+
+class TestIncrementalTranslate(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        os.makedirs(os.path.join(self.root, 'tenants', 'one'))
+        os.makedirs(os.path.join(self.root, 'app', 'templates'))
+        self._write('app/views.py', 'from django.utils.translation import gettext as _\n\nMESSAGE = _("Hello")\n')
+        self._write('app/templates/page.html', '{% load i18n %}<h1>{% trans "Welcome" %}</h1>\n')
+
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+        overrides = override_settings(MULTI_TENANT_DIR=os.path.join(self.root, 'tenants'), PROJECT_ROOT=self.root,
+                                      TENANT_EXTRAS_CACHE_DIR=self.cache_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _write(self, path, content):
+        with open(os.path.join(self.root, path), 'w') as f:
+            f.write(content)
+        # Make sure the modification time differs from the previous write
+        mtime = os.stat(os.path.join(self.root, path)).st_mtime
+        os.utime(os.path.join(self.root, path), (mtime, mtime + 10))
+
+    def _translate(self, **options):
+        def makepo(*args, **kwargs):
+            for locale in kwargs['locale']:
+                po_dir = os.path.join(self.root, 'locale', locale, 'LC_MESSAGES')
+                if not os.path.isdir(po_dir):
+                    os.makedirs(po_dir)
+                open(os.path.join(po_dir, 'django.po'), 'w').close()
+
+        options = dict(dict(locale=['nl'], incremental=True, verbosity=0), **options)
+        with mock.patch.object(translate, 'call_command', side_effect=makepo) as call_command:
+            translate.Command(stdout=StringIO()).handle(**options)
+        return call_command.call_count
+
+    def test_python_messages(self):
+        self.assertEqual(
+            translate._python_messages('_("One")\nngettext("{} item", "{} items", n)\nprint("Two")\n'),
+            ['"One"', '"{} item"', '"{} items"']
+        )
+
+    def test_extract(self):
+        cache = translate.extract_messages([os.curdir], ['tenants'], ['nl'])
+
+        self.assertEqual(sorted(cache['files']), ['app/templates/page.html', 'app/views.py'])
+        self.assertEqual(cache['files']['app/views.py']['msgids'], ['"Hello"'])
+        self.assertEqual(len(cache['files']['app/templates/page.html']['msgids']), 1)
+
+    def test_incremental(self):
+        self.assertEqual(self._translate(), 1)
+        self.assertTrue(os.path.exists(translate._cache_path()))
+        self.assertEqual(os.listdir(os.path.join(self.root, 'locale')), ['nl'])
+        self.assertEqual(self._translate(jobs=2), 0)
+
+        # Changed, but not the messages
+        self._write('app/views.py', 'from django.utils.translation import gettext as _\n\nMESSAGE =  _("Hello")\n')
+        self.assertEqual(self._translate(), 0)
+
+        self._write('app/templates/page.html', '{% load i18n %}<h1>{% trans "Welcome back" %}</h1>\n')
+        self.assertEqual(self._translate(jobs=2), 1)
+        self.assertEqual(self._translate(), 0)
+
+        # Other locales still need their po files
+        self.assertEqual(self._translate(locale=['nl', 'fr']), 1)
+
+        os.remove(os.path.join(self.root, 'locale', 'fr', 'LC_MESSAGES', 'django.po'))
+        self.assertEqual(self._translate(locale=['nl', 'fr']), 1)
+
+    def test_not_incremental(self):
+        self.assertEqual(self._translate(incremental=False), 1)
+        self.assertEqual(self._translate(incremental=False), 1)
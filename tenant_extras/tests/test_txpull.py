@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from io import StringIO
+
+import mock
+
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from tenant_extras.management.commands import txpull
+
+try:
+    import txclib
+except ImportError:
+    txclib = None
+
+
+class FakeProject(object):
+    """
+    Stands in for the Transifex client project, writing an en_GB catalog.
+    """
+    failing = set()
+
+    def __init__(self, root):
+        self.root = root
+
+    def pull(self, **kwargs):
+        if os.path.basename(self.root) in self.failing:
+            raise Exception('Not found')
+        os.makedirs(os.path.join(self.root, 'locale', 'en_GB', 'LC_MESSAGES'))
+
+
+class TestTxPull(SimpleTestCase):
+    def setUp(self):
+        self.tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tenant_dir)
+
+        for tenant in ('one', 'two', 'three'):
+            os.makedirs(os.path.join(self.tenant_dir, tenant))
+
+    def _pull(self, **options):
+        command = txpull.Command(stdout=StringIO(), stderr=StringIO())
+        with override_settings(MULTI_TENANT_DIR=self.tenant_dir):
+            with mock.patch.object(command, 'get_project', side_effect=FakeProject):
+                try:
+                    command.handle(**options)
+                finally:
+                    self.stdout = command.stdout._out.getvalue()
+                    self.stderr = command.stderr._out.getvalue()
+
+    def test_pull_all(self):
+        cwd = os.getcwd()
+        self._pull(all=True, deploy=True, jobs=3)
+
+        self.assertEqual(os.getcwd(), cwd)
+        for tenant in ('one', 'two', 'three'):
+            self.assertTrue(os.path.isdir(os.path.join(self.tenant_dir, tenant, 'locale', 'en')))
+            self.assertIn('Pulled translations for {}'.format(tenant), self.stdout)
+
+    def test_pull_failed(self):
+        with mock.patch.object(FakeProject, 'failing', {'two'}):
+            with self.assertRaisesRegex(CommandError, 'two'):
+                self._pull(all=True, jobs=2)
+
+        self.assertIn('Failed to pull translations for two: Not found', self.stderr)
+        self.assertIn('Pulled translations for one', self.stdout)
+        self.assertIn('Pulled translations for three', self.stdout)
+
+
+@unittest.skipUnless(txclib, 'Needs the Transifex client')
+class TestGetProject(SimpleTestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home)
+        self.tenant_dir = os.path.join(self.home, 'one')
+
+        os.makedirs(os.path.join(self.tenant_dir, '.tx'))
+        with open(os.path.join(self.tenant_dir, '.tx', 'config'), 'w') as f:
+            f.write('[main]\nhost = https://www.transifex.com\n')
+
+    def _write_txrc(self, path, password):
+        with open(path, 'w') as f:
+            f.write('[https://www.transifex.com]\nhostname = https://www.transifex.com\n'
+                    'username = api\npassword = {}\n'.format(password))
+
+    def test_tenant_txrc(self):
+        self._write_txrc(os.path.join(self.home, '.transifexrc'), 'user')
+        self._write_txrc(os.path.join(self.tenant_dir, '.transifexrc'), 'tenant')
+
+        with mock.patch.dict(os.environ, {'HOME': self.home}):
+            project = txpull.Command().get_project(self.tenant_dir)
+
+        self.assertEqual(project.txrc_file, os.path.join(self.tenant_dir, '.transifexrc'))
+        self.assertEqual(project.txrc.get('https://www.transifex.com', 'password'), 'tenant')
+
+    def test_user_txrc(self):
+        self._write_txrc(os.path.join(self.home, '.transifexrc'), 'user')
+
+        with mock.patch.dict(os.environ, {'HOME': self.home}):
+            project = txpull.Command().get_project(self.tenant_dir)
+
+        self.assertEqual(project.txrc.get('https://www.transifex.com', 'password'), 'user')
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+
+import mock
+
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from tenant_extras.management.commands import translate, txtranslate
+
+
+class FakeProject(object):
+    """
+    Stands in for the Transifex client project, with one resource per
+    source file in the tenant directory.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.pushed = []
+
+    def get_resource_list(self):
+        return ['project.{}'.format(name) for name in sorted(os.listdir(self.root)) if name.endswith('.po')]
+
+    def get_source_file(self, resource):
+        return resource.split('.', 1)[1]
+
+    def get_full_path(self, relpath):
+        return os.path.join(self.root, relpath)
+
+    def push(self, source=False, no_interactive=False, resources=[]):
+        if 'broken' in self.root:
+            raise Exception('Not allowed')
+        self.pushed.append(resources)
+
+
+class TestTxTranslate(SimpleTestCase):
+    def setUp(self):
+        self.tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tenant_dir)
+        self.project_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.project_root)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+        for tenant in ('one', 'two'):
+            os.makedirs(os.path.join(self.tenant_dir, tenant))
+            for name in ('django.po', 'djangojs.po'):
+                self._write(tenant, name, 'msgid "Hello"\n')
+
+        self.projects = {}
+
+    def _write(self, tenant, name, content):
+        with open(os.path.join(self.tenant_dir, tenant, name), 'w') as f:
+            f.write(content)
+
+    def _project(self, tenant_dir):
+        project = FakeProject(tenant_dir)
+        self.projects[os.path.basename(tenant_dir)] = project
+        return project
+
+    def _translate(self, **options):
+        self.projects = {}
+        command = txtranslate.Command(stdout=StringIO(), stderr=StringIO())
+        options = dict(dict(push=True, locale=['en'], jobs=2, verbosity=0), **options)
+
+        with override_settings(MULTI_TENANT_DIR=self.tenant_dir, PROJECT_ROOT=self.project_root,
+                               TENANT_EXTRAS_CACHE_DIR=self.cache_dir):
+            with mock.patch.object(translate, 'call_command'), \
+                    mock.patch.object(command, 'get_project', side_effect=self._project):
+                command.handle(**options)
+
+    def test_default_jobs(self):
+        self.assertEqual(txtranslate.Command().create_parser('manage.py', 'txtranslate').parse_args([]).jobs, 4)
+        self.assertEqual(translate.Command().create_parser('manage.py', 'translate').parse_args([]).jobs, 1)
+
+    def test_push_changed(self):
+        self._translate()
+        self.assertEqual(self.projects['one'].pushed, [['project.django.po', 'project.djangojs.po']])
+        self.assertEqual(self.projects['two'].pushed, [['project.django.po', 'project.djangojs.po']])
+
+        self._translate()
+        self.assertEqual(self.projects['one'].pushed, [])
+        self.assertEqual(self.projects['two'].pushed, [])
+        # Nothing is written next to the sources
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tenant_dir, 'one'))), ['django.po', 'djangojs.po'])
+
+        self._write('two', 'djangojs.po', 'msgid "Goodbye"\n')
+        self._translate()
+        self.assertEqual(self.projects['one'].pushed, [])
+        self.assertEqual(self.projects['two'].pushed, [['project.djangojs.po']])
+
+        self._translate(push_all=True)
+        self.assertEqual(self.projects['one'].pushed, [['project.django.po', 'project.djangojs.po']])
+
+    def test_regenerated_header(self):
+        header = 'msgid ""\nmsgstr ""\n"POT-Creation-Date: {}\\n"\n\nmsgid "Hello"\n'
+        self._write('one', 'django.po', header.format('2016-01-01 10:00+0000'))
+        self._translate()
+
+        self._write('one', 'django.po', header.format('2016-01-02 12:00+0000'))
+        self._translate()
+        self.assertEqual(self.projects['one'].pushed, [])
+
+    def test_push_failed(self):
+        os.makedirs(os.path.join(self.tenant_dir, 'broken'))
+        self._write('broken', 'django.po', 'msgid "Hello"\n')
+
+        with self.assertRaisesRegex(CommandError, 'broken'):
+            self._translate()
+        with self.settings(TENANT_EXTRAS_CACHE_DIR=self.cache_dir):
+            self.assertFalse(os.path.exists(txtranslate._hashes_path(os.path.join(self.tenant_dir, 'broken'))))
+
+        with self.assertRaisesRegex(CommandError, 'broken'):
+            self._translate()
+        self.assertEqual(self.projects['one'].pushed, [])
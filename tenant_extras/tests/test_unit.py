@@ -4,6 +4,7 @@ from mock import patch
 
 from munch import munchify
 
+from django.utils import translation
 from django.utils.translation import ugettext as _
 from django.conf import settings
 from django.test import RequestFactory, TestCase
@@ -16,6 +17,7 @@ from ..drf_permissions import TenantConditionalOpenClose
 from ..middleware import TenantLocaleMiddleware
 from ..utils import TenantLanguage
 import tenant_extras.compat
+import tenant_extras.utils
 
 
 @override_settings(MULTI_TENANT_DIR='/clients', INSTALLED_APPS=(),
@@ -133,6 +135,227 @@ class TenantLocaleTestCase(TestCase):
             self.assertEqual(_('Tenant Name'), 'Tenant 2 EN',
                              'Tenant 2 should not have translations from Tenant 1')
 
+    def test_shared_base_catalog(self):
+        from ..middleware import tenant_translation
+
+        nl1 = tenant_translation('nl', 'tenant1')
+        nl2 = tenant_translation('nl', 'tenant2')
+
+        self.assertIs(nl1._catalog.base, nl2._catalog.base)
+        self.assertEqual(nl1.gettext('Tenant Name'), 'Tenant 1 NL')
+        self.assertEqual(nl2.gettext('Tenant Name'), 'Tenant 2 NL')
+        # From the Django catalog
+        self.assertEqual(nl1.gettext('This field is required.'), 'Dit veld is verplicht.')
+        self.assertEqual(nl1.ngettext('%d minute', '%d minutes', 2), '%d minuten')
+
+    def test_reload_changed_catalog(self):
+        import shutil
+        import tempfile
+        from .. import middleware
+
+        tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tenant_dir)
+        shutil.copytree(os.path.join(settings.MULTI_TENANT_DIR, 'tenant1'),
+                        os.path.join(tenant_dir, 'tenant1'))
+        mo_file = os.path.join(tenant_dir, 'tenant1', 'locale', 'nl', 'LC_MESSAGES', 'django.mo')
+        other_mo_file = os.path.join(settings.MULTI_TENANT_DIR, 'tenant2', 'locale', 'nl',
+                                     'LC_MESSAGES', 'django.mo')
+
+        with self.settings(MULTI_TENANT_DIR=tenant_dir, TENANT_TRANSLATION_RELOAD_INTERVAL=0), \
+                mock.patch.object(middleware, '_tenants', middleware.LRUCache(maxsize=None)):
+            nl = middleware.tenant_translation('nl', 'tenant1')
+            self.assertEqual(nl.gettext('Tenant Name'), 'Tenant 1 NL')
+            self.assertIs(middleware.tenant_translation('nl', 'tenant1'), nl)
+
+            shutil.copy(other_mo_file, mo_file)
+            os.utime(mo_file, ns=(0, os.stat(mo_file).st_mtime_ns + 10 ** 9))
+
+            reloaded = middleware.tenant_translation('nl', 'tenant1')
+            self.assertIsNot(reloaded, nl)
+            self.assertEqual(reloaded.gettext('Tenant Name'), 'Tenant 2 NL')
+
+    def test_reload_changed_fallback(self):
+        import shutil
+        import tempfile
+        from .. import middleware
+
+        tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tenant_dir)
+        shutil.copytree(os.path.join(settings.MULTI_TENANT_DIR, 'tenant1'),
+                        os.path.join(tenant_dir, 'tenant1'))
+        mo_file = os.path.join(tenant_dir, 'tenant1', 'locale', 'en', 'LC_MESSAGES', 'django.mo')
+        other_mo_file = os.path.join(settings.MULTI_TENANT_DIR, 'tenant2', 'locale', 'en',
+                                     'LC_MESSAGES', 'django.mo')
+        clock = [0]
+
+        with self.settings(MULTI_TENANT_DIR=tenant_dir, TENANT_TRANSLATION_RELOAD_INTERVAL=10), \
+                mock.patch.object(middleware, '_tenants', middleware.LRUCache(maxsize=None)), \
+                mock.patch.object(middleware.time, 'monotonic', side_effect=lambda: clock[0]):
+            en = middleware.tenant_translation('en', 'tenant1')
+
+            shutil.copy(other_mo_file, mo_file)
+            os.utime(mo_file, ns=(0, os.stat(mo_file).st_mtime_ns + 10 ** 9))
+
+            # Built before the fallback is checked again, so with the old one
+            clock[0] = 5
+            fr = middleware.tenant_translation('fr', 'tenant1')
+            self.assertIs(fr._fallback, en)
+            self.assertEqual(fr.gettext('Tenant Name'), 'Tenant 1 EN')
+
+            clock[0] = 16
+            reloaded = middleware.tenant_translation('fr', 'tenant1')
+            self.assertIsNot(reloaded, fr)
+            self.assertEqual(reloaded.gettext('Tenant Name'), 'Tenant 2 EN')
+            self.assertIs(reloaded._fallback, middleware.tenant_translation('en', 'tenant1'))
+
+    def test_reload_changed_base_catalog(self):
+        import shutil
+        import tempfile
+        from .. import middleware
+
+        tenant_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tenant_dir)
+        os.makedirs(os.path.join(tenant_dir, 'tenant3'))
+        locale_dir = os.path.join(tenant_dir, 'locale')
+        mo_file = os.path.join(locale_dir, 'nl', 'LC_MESSAGES', 'django.mo')
+        os.makedirs(os.path.dirname(mo_file))
+        shutil.copy(os.path.join(settings.MULTI_TENANT_DIR, 'tenant1', 'locale', 'nl', 'LC_MESSAGES', 'django.mo'),
+                    mo_file)
+        other_mo_file = os.path.join(settings.MULTI_TENANT_DIR, 'tenant2', 'locale', 'nl',
+                                     'LC_MESSAGES', 'django.mo')
+        # Changing LOCALE_PATHS replaces the active translations of Django,
+        # which TenantLanguage looks up through the cache of _trans
+        self.addCleanup(translation._trans.__dict__.pop, '_active', None)
+
+        with self.settings(MULTI_TENANT_DIR=tenant_dir, LOCALE_PATHS=[locale_dir],
+                           TENANT_TRANSLATION_RELOAD_INTERVAL=0), \
+                mock.patch.object(middleware, '_tenants', middleware.LRUCache(maxsize=None)):
+            nl = middleware.tenant_translation('nl', 'tenant3')
+            self.assertEqual(nl.gettext('Tenant Name'), 'Tenant 1 NL')
+
+            shutil.copy(other_mo_file, mo_file)
+            os.utime(mo_file, ns=(0, os.stat(mo_file).st_mtime_ns + 10 ** 9))
+
+            reloaded = middleware.tenant_translation('nl', 'tenant3')
+            self.assertIsNot(reloaded._catalog.base, nl._catalog.base)
+            self.assertEqual(reloaded.gettext('Tenant Name'), 'Tenant 2 NL')
+
+    def test_catalog_files_ordered(self):
+        from .. import middleware
+
+        self.assertEqual(list(middleware._catalog_files('pt-br', ['a', 'b'])), [
+            os.path.join('a', 'pt_BR', 'LC_MESSAGES', 'django.mo'),
+            os.path.join('a', 'pt', 'LC_MESSAGES', 'django.mo'),
+            os.path.join('b', 'pt_BR', 'LC_MESSAGES', 'django.mo'),
+            os.path.join('b', 'pt', 'LC_MESSAGES', 'django.mo'),
+        ])
+        self.assertEqual(list(middleware._catalog_files('nl', ['a'])), [
+            os.path.join('a', 'nl', 'LC_MESSAGES', 'django.mo'),
+        ])
+
+    def test_translation_cache_bounded(self):
+        from .. import middleware
+
+        connection.tenant = self.tenant1
+        with self.settings(TENANT_TRANSLATION_CACHE_SIZE=1):
+            with TenantLanguage('nl'):
+                self.assertEqual(_('Tenant Name'), 'Tenant 1 NL')
+
+            self.assertEqual(middleware._tenants.keys(), [('tenant1', 'nl')])
+            self.assertTrue(middleware.get_translation_cache_stats()['weight'])
+
+    def test_catalog_size_in_bytes(self):
+        from .. import middleware
+
+        translation = mock.Mock(_catalog={u'Caf\xe9': u'Caf\xe9 NL', ('%d minute', 0): '%d minuut'})
+        self.assertEqual(middleware._catalog_size(translation), 5 + 8 + 9 + 9)
+
+    def test_translation_built_once(self):
+        import threading
+        import time
+        from .. import middleware
+
+        def build(language, tenant_name):
+            time.sleep(0.05)
+            return mock.Mock()
+
+        with mock.patch.object(middleware, '_tenants', middleware.LRUCache(maxsize=None)), \
+                mock.patch.object(middleware, 'DjangoTranslation', side_effect=build) as translation:
+            results = []
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(middleware.tenant_translation('nl', 'tenant1'))
+                ) for i in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(translation.call_count, 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+        self.assertEqual(middleware._building, {})
+
+    def test_warm_translations(self):
+        from .. import middleware
+
+        cache = middleware.LRUCache(maxsize=None, weigher=middleware._catalog_size)
+        with mock.patch.object(middleware, '_tenants', cache):
+            result = middleware.warm_tenant_translations(['tenant1', 'tenant2'], ['en', 'nl'])
+
+            self.assertEqual(result['translations'], 4)
+            self.assertTrue(result['size'])
+            self.assertEqual(
+                sorted(middleware._tenants.keys()),
+                [('tenant1', 'en'), ('tenant1', 'nl'), ('tenant2', 'en'), ('tenant2', 'nl')]
+            )
+
+    def test_warm_translations_names_first(self):
+        from .. import middleware
+
+        events = []
+        with mock.patch.object(middleware, 'activate_tenant', side_effect=lambda t: events.append('activate')), \
+                mock.patch.object(middleware, 'connection'), \
+                mock.patch.object(middleware, 'tenant_translation',
+                                  side_effect=lambda language, tenant_name: events.append(tenant_name)):
+            middleware.warm_tenant_translations([munchify({'client_name': 'tenant1'}), 'tenant2'], ['nl'])
+
+        # Not with the properties of tenant1
+        self.assertEqual(events, ['tenant2', 'activate', 'tenant1'])
+
+    def test_warm_translations_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .. import middleware
+
+        tenant = munchify({'client_name': 'tenant1'})
+        tenant_model = mock.Mock()
+        tenant_model.objects.filter.return_value = [tenant]
+        stdout = StringIO()
+        stderr = StringIO()
+
+        with mock.patch.object(middleware, '_tenants', middleware.LRUCache(maxsize=None)), \
+                mock.patch('tenant_extras.management.commands.warm_translations.get_tenant_model',
+                           return_value=tenant_model), \
+                mock.patch.object(middleware, 'activate_tenant') as activate, \
+                mock.patch.object(middleware, 'connection'):
+            call_command('warm_translations', locale=['en', 'nl'], stdout=stdout, stderr=stderr)
+
+            self.assertEqual(
+                sorted(middleware._tenants.keys()),
+                [('tenant1', 'en'), ('tenant1', 'nl'), ('tenant2', 'en'), ('tenant2', 'nl')]
+            )
+
+        activate.assert_called_once_with(tenant)
+        self.assertIn('Built 4 translations', stdout.getvalue())
+        self.assertIn('No tenant found for tenant2', stderr.getvalue())
+
+    def test_tenant_names(self):
+        self.assertEqual(tenant_extras.utils.get_tenant_names(), ['tenant1', 'tenant2'])
+
+        with self.settings(MULTI_TENANT_DIR=None):
+            self.assertEqual(tenant_extras.utils.get_tenant_names(), [])
+
 
 @mock.patch('django.db.connection',
             munchify({'tenant': {'name': 'My Test', 'client_name': 'test'}}))
@@ -163,9 +386,71 @@ class TenantPropertiesContextProcessorTestCase(TestCase):
         self.assertEqual(context['TEST'], 'my-very-own-test-value')
         self.assertIn('"test": "my-very-own-test-value"', context['settings'])
 
+    @override_settings(EXPOSED_TENANT_PROPERTIES=['test'],
+                       TEST='value-for-test')
+    def test_settings_cached(self):
+        from .. import context_processors
+
+        with mock.patch.object(context_processors, '_tenant_properties',
+                               wraps=context_processors._tenant_properties) as build:
+            first = context_processors.tenant_properties(self.rf)
+            second = context_processors.tenant_properties(self.rf)
+
+            self.rf.LANGUAGE_CODE = 'nl'
+            third = context_processors.tenant_properties(self.rf)
+
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(first, second)
+        self.assertIn('"languageCode": "nl"', third['settings'])
+
+    @override_settings(EXPOSED_TENANT_PROPERTIES=['test'],
+                       TEST='value-for-test')
+    def test_settings_cache_size(self):
+        from .. import context_processors
+
+        with self.settings(TENANT_SETTINGS_CACHE_SIZE=1):
+            self.assertEqual(context_processors._settings_cache.maxsize, 1)
+            context_processors.tenant_properties(self.rf)
+            self.rf.LANGUAGE_CODE = 'nl'
+            context_processors.tenant_properties(self.rf)
+            self.assertEqual(len(context_processors._settings_cache), 1)
+
+        self.assertEqual(context_processors._settings_cache.maxsize, 1024)
+
+    @override_settings(EXPOSED_TENANT_PROPERTIES=['test'],
+                       TEST='value-for-test')
+    def test_settings_cache_invalidated(self):
+        from .. import context_processors
+        from ..utils import invalidate_tenant_properties
+
+        context_processors.tenant_properties(self.rf)
+        invalidate_tenant_properties('test')
+
+        with mock.patch.object(context_processors, '_tenant_properties',
+                               wraps=context_processors._tenant_properties) as build:
+            context_processors.tenant_properties(self.rf)
+
+        self.assertEqual(build.call_count, 1)
+
+    @override_settings(EXPOSED_TENANT_PROPERTIES=['test'],
+                       TEST='value-for-test')
+    def test_settings_serialized_once(self):
+        import json
+        from ..context_processors import tenant_properties
+
+        with mock.patch('tenant_extras.context_processors.json.dumps',
+                        wraps=json.dumps) as dumps:
+            context = tenant_properties(self.rf)
+            tenant_properties(self.rf)
+            self.assertEqual(dumps.call_count, 1)
+
+        self.assertIs(type(context['settings']), str)
+        self.assertEqual(json.loads(context['settings'])['test'], 'value-for-test')
+        self.assertEqual(len(str(context['settings_version'])), 32)
+
     def test_no_exposed_tenant_properties_setting(self):
-        with mock.patch('tenant_extras.utils.get_tenant_properties') as get_tenant_properties, \
-                mock.patch('django.conf.settings', spec={}) as settings:
+        with mock.patch('tenant_extras.context_processors.get_tenant_properties') as get_tenant_properties, \
+                mock.patch('tenant_extras.context_processors.settings', spec={}) as settings:
 
             from ..context_processors import tenant_properties
 
@@ -256,3 +541,121 @@ class TestGetTenantProperties(TestCase):
         from tenant_extras.utils import get_tenant_properties
 
         self.assertEquals(get_tenant_properties(), props)
+
+    @override_settings(TENANT_PROPERTIES="tenant_extras.tests.properties.properties2")
+    def test_properties_memoized(self):
+        from tenant_extras.utils import get_tenant_properties
+
+        with mock.patch('tenant_extras.utils._load_tenant_properties',
+                        wraps=tenant_extras.utils._load_tenant_properties) as load:
+            first = get_tenant_properties()
+            second = get_tenant_properties()
+
+        self.assertIs(first, second)
+        self.assertEqual(load.call_count, 1)
+
+    def test_properties_cleared_on_setting_changed(self):
+        from tenant_extras.tests.properties import properties1, properties2
+        from tenant_extras.utils import get_tenant_properties
+
+        self.assertIs(get_tenant_properties(), properties1)
+
+        with override_settings(TENANT_PROPERTIES="tenant_extras.tests.properties.properties2"):
+            self.assertIs(get_tenant_properties(), properties2)
+
+        self.assertIs(get_tenant_properties(), properties1)
+
+
+@override_settings(TENANT_PROPERTIES_SNAPSHOTS=True)
+class TestTenantPropertiesSnapshot(TestCase):
+    def setUp(self):
+        connection.tenant = munchify({'name': 'My Test', 'client_name': 'tenant1'})
+
+    def tearDown(self):
+        del connection.tenant
+
+    def test_snapshot_values(self):
+        from tenant_extras.utils import get_tenant_properties
+
+        self.assertEqual(get_tenant_properties('LANGUAGE_CODE'), 'en')
+        # Falls through to settings
+        self.assertEqual(get_tenant_properties('TENANT_PROPERTIES_SNAPSHOTS'), True)
+
+        with self.assertRaises(ImproperlyConfigured):
+            get_tenant_properties('NOT_DEFINED')
+
+    def test_snapshot_reused(self):
+        from tenant_extras.utils import get_tenant_properties
+
+        self.assertIs(get_tenant_properties(), get_tenant_properties())
+
+    def test_snapshot_per_tenant(self):
+        from tenant_extras.utils import get_tenant_properties
+
+        first = get_tenant_properties()
+        connection.tenant = munchify({'name': 'My Test', 'client_name': 'tenant2'})
+        self.assertIsNot(get_tenant_properties(), first)
+
+    def test_snapshot_rebuilt_for_new_version(self):
+        from tenant_extras.utils import (get_tenant_properties,
+                                         get_tenant_properties_version,
+                                         invalidate_tenant_properties)
+
+        first = get_tenant_properties()
+        version = get_tenant_properties_version()
+
+        invalidate_tenant_properties('tenant1')
+
+        self.assertEqual(get_tenant_properties_version(), version + 1)
+        self.assertIsNot(get_tenant_properties(), first)
+
+    def test_get_many(self):
+        from tenant_extras.utils import get_tenant_properties_many
+
+        self.assertEqual(
+            get_tenant_properties_many(['LANGUAGE_CODE', 'DONATIONS_ENABLED', 'NOT_DEFINED']),
+            {'LANGUAGE_CODE': 'en', 'DONATIONS_ENABLED': True}
+        )
+
+
+@mock.patch('django.db.connection',
+            munchify({'tenant': {'name': 'My Test', 'client_name': 'test'}}))
+@override_settings(EXPOSED_TENANT_PROPERTIES=['test'], TEST='value-for-test')
+class TenantSettingsViewTestCase(TestCase):
+
+    def setUp(self):
+        self.rf = RequestFactory()
+
+    def _get(self, **headers):
+        from ..views import tenant_settings
+
+        request = self.rf.get('/en/settings.json', **headers)
+        request.LANGUAGE_CODE = 'en'
+        return tenant_settings(request)
+
+    def test_settings(self):
+        response = self._get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"test": "value-for-test"', response.content)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Language, Cookie')
+
+    def test_not_modified(self):
+        etag = self._get()['ETag']
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['Vary'], 'Accept-Language, Cookie')
+        self.assertIn('max-age=', response['Cache-Control'])
+
+    def test_changed(self):
+        etag = self._get()['ETag']
+
+        with self.settings(TEST='other-value'):
+            response = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,81 @@
+from io import StringIO
+
+import mock
+
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from tenant_extras.management.commands import with_tenant
+
+
+class FakeTenant(object):
+    def __init__(self, schema_name):
+        self.schema_name = schema_name
+
+
+class FakeTenantModel(object):
+    """
+    Stands in for the tenant model, with a public and three tenants.
+    """
+    tenants = [FakeTenant(name) for name in ('public', 'one', 'two', 'three')]
+
+    class objects(object):
+        @staticmethod
+        def all():
+            return FakeTenantModel.tenants
+
+        @staticmethod
+        def get(schema_name):
+            return [t for t in FakeTenantModel.tenants if t.schema_name == schema_name][0]
+
+
+active = {}
+
+
+def fake_activate_tenant(tenant):
+    active['tenant'] = tenant
+
+
+def fake_call_command(name, *args, **options):
+    tenant = active['tenant'].schema_name
+    if tenant == 'two':
+        raise CommandError('Broken data')
+    print('{} for {}'.format(name, tenant))
+
+
+class TestAllTenants(SimpleTestCase):
+    def _run(self, jobs, **options):
+        command = with_tenant.Command(stdout=StringIO())
+        with mock.patch.object(with_tenant, 'get_tenant_model', return_value=FakeTenantModel), \
+                mock.patch.object(with_tenant, 'activate_tenant', side_effect=fake_activate_tenant), \
+                mock.patch.object(with_tenant, 'call_command', side_effect=fake_call_command):
+            try:
+                command.handle('rebuild_index', all_tenants=True, jobs=jobs, verbosity=1, **options)
+            finally:
+                self.output = command.stdout._out.getvalue()
+
+    def _assert_output(self):
+        self.assertNotIn('public', self.output)
+        self.assertIn('=== one (status 0', self.output)
+        self.assertIn('rebuild_index for one', self.output)
+        self.assertIn('=== two (status 1', self.output)
+        self.assertIn('CommandError: Broken data', self.output)
+        self.assertIn('rebuild_index for three', self.output)
+        self.assertIn('Ran rebuild_index for 3 tenants', self.output)
+
+    def test_serial(self):
+        with self.assertRaisesRegex(CommandError, 'rebuild_index failed for two'):
+            self._run(jobs=1)
+        self._assert_output()
+
+    def test_parallel(self):
+        with self.assertRaisesRegex(CommandError, 'rebuild_index failed for two'):
+            self._run(jobs=3)
+        self._assert_output()
+
+    def test_called_with_output(self):
+        # call_command passes the streams of the command in the options
+        for jobs in (1, 3):
+            with self.assertRaisesRegex(CommandError, 'rebuild_index failed for two'):
+                self._run(jobs=jobs, stdout=StringIO(), stderr=StringIO(), no_color=True)
+            self._assert_output()
@@ -1,18 +1,31 @@
+import hashlib
+import importlib
 import os
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
 from django.db import connection
+from django.dispatch import receiver
 from django.utils import translation
 
+from .generations import check_tenant_generation, tenant_changed
 
-def get_tenant_properties(property=None):
-    """
-    Returns a tenant property, or all if none specified.
-    """
+_properties = {}
+_snapshots = {}
+_versions = {}
 
-    properties_path = getattr(settings, 'TENANT_PROPERTIES')
+_missing = object()
 
+# Directory for the state commands keep between runs, unless set with
+# TENANT_EXTRAS_CACHE_DIR
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'tenant_extras')
+
+
+def _load_tenant_properties(properties_path):
+    """
+    Imports and returns the properties object at the dotted path.
+    """
     parts = properties_path.split('.')
     module = '.'.join([parts[i] for i in range(0, len(parts) - 1)])
     properties = parts[len(parts) - 1]
@@ -29,6 +42,109 @@ def get_tenant_properties(property=None):
         raise ImproperlyConfigured(
             "{0} needs attribute name '{1}'".format(module, properties))
 
+    return props
+
+
+def _resolve_tenant_properties():
+    """
+    Returns the properties object, resolved once per TENANT_PROPERTIES path
+    and kept for the life of the process.
+    """
+    properties_path = getattr(settings, 'TENANT_PROPERTIES')
+
+    try:
+        return _properties[properties_path]
+    except KeyError:
+        props = _load_tenant_properties(properties_path)
+        _properties[properties_path] = props
+        return props
+
+
+def get_tenant_name():
+    """
+    Returns the client name of the tenant on the connection, if any.
+    """
+    return getattr(getattr(connection, 'tenant', None), 'client_name', None)
+
+
+class TenantPropertiesSnapshot(object):
+    """
+    Read-only view of the properties of a single tenant.
+
+    The values the tenant defines itself (`tenant_properties`) are copied
+    when the snapshot is built. Anything else falls through to the
+    properties object once and is remembered for the life of the snapshot.
+    """
+    def __init__(self, properties, version):
+        self._properties = properties
+        self.version = version
+
+        values = getattr(properties, 'tenant_properties', None)
+        self._values = dict(values) if isinstance(values, dict) else {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        value = self._values.get(name, _missing)
+        if value is _missing:
+            value = getattr(self._properties, name, _missing)
+            self._values[name] = value
+
+        if value is _missing:
+            raise AttributeError(name)
+        return value
+
+
+def get_tenant_properties_version(tenant_name=None):
+    """
+    Returns the properties version of a tenant, the current one by default.
+    """
+    if tenant_name is None:
+        tenant_name = get_tenant_name()
+    check_tenant_generation(tenant_name)
+    return _versions.get(tenant_name, 0)
+
+
+def invalidate_tenant_properties(tenant_name=None):
+    """
+    Bumps the properties version of a tenant, so its snapshot is rebuilt on
+    the next lookup.
+    """
+    if tenant_name is None:
+        tenant_name = get_tenant_name()
+    _versions[tenant_name] = _versions.get(tenant_name, 0) + 1
+
+
+def get_tenant_properties_snapshot():
+    """
+    Returns the properties snapshot of the current tenant, building it when
+    it is missing or its version is stale.
+    """
+    tenant_name = get_tenant_name()
+    check_tenant_generation(tenant_name)
+    version = _versions.get(tenant_name, 0)
+
+    snapshot = _snapshots.get(tenant_name)
+    if snapshot is None or snapshot.version != version:
+        snapshot = TenantPropertiesSnapshot(_resolve_tenant_properties(), version)
+        _snapshots[tenant_name] = snapshot
+
+    return snapshot
+
+
+def get_tenant_properties(property=None):
+    """
+    Returns a tenant property, or all if none specified.
+
+    With TENANT_PROPERTIES_SNAPSHOTS enabled the properties are read from a
+    per-tenant snapshot instead of the properties object.
+    """
+    if getattr(settings, 'TENANT_PROPERTIES_SNAPSHOTS', False):
+        props = get_tenant_properties_snapshot()
+    else:
+        props = _resolve_tenant_properties()
+
     try:
         if property:
             return getattr(props, property)
@@ -39,6 +155,67 @@ def get_tenant_properties(property=None):
     return props
 
 
+def get_tenant_properties_many(names):
+    """
+    Returns a dict with the values of the given tenant properties. Names
+    that are not defined are left out.
+    """
+    props = get_tenant_properties()
+
+    values = {}
+    for name in names:
+        value = getattr(props, name, _missing)
+        if value is not _missing:
+            values[name] = value
+    return values
+
+
+@receiver(tenant_changed)
+def tenant_properties_changed(tenant_name, **kwargs):
+    invalidate_tenant_properties(tenant_name)
+
+
+@receiver(setting_changed)
+def clear_tenant_properties(**kwargs):
+    # Snapshots hold values that fall through to settings
+    _snapshots.clear()
+    if kwargs['setting'] == 'TENANT_PROPERTIES':
+        _properties.clear()
+
+
+def get_tenant_names():
+    """
+    Returns the names of the tenant directories in MULTI_TENANT_DIR, if set.
+    """
+    tenant_dir = getattr(settings, 'MULTI_TENANT_DIR', None)
+    if not tenant_dir:
+        return []
+    return sorted(f for f in os.listdir(tenant_dir) if os.path.isdir(os.path.join(tenant_dir, f)))
+
+
+def get_cache_path(command, path):
+    """
+    Returns the path of the file a command keeps its state for a source
+    directory in, in the cache directory so nothing is written to the
+    source tree.
+    """
+    cache_dir = getattr(settings, 'TENANT_EXTRAS_CACHE_DIR', None) or CACHE_DIR
+    name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, command, name + '.json')
+
+
+def activate_tenant(tenant):
+    """
+    Sets the tenant on the database connection and the tenant properties.
+    """
+    connection.set_tenant(tenant)
+
+    tenant_model_path = tenant.__module__
+    tenant_app_path = tenant_model_path.replace('.models', '')
+    properties = importlib.import_module(tenant_app_path).properties
+    properties.set_tenant(tenant)
+
+
 class TenantLanguage():
 
     def __init__(self, language):
@@ -1,8 +1,15 @@
 import os
 
+from django.conf import settings
 from django.db import connection
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 from django.views.static import serve as base_serve
 
+from .context_processors import get_tenant_settings
+
+
 def serve(request, path, document_root=None, show_indexes=False):
     """ intercept requests for /static/cache and send them to
         the tenant cache dir
@@ -13,3 +20,32 @@ def serve(request, path, document_root=None, show_indexes=False):
         path = os.path.join('/' + connection.tenant.schema_name, tpath)
 
     return base_serve(request, path, document_root, show_indexes)
+
+
+def tenant_settings(request):
+    """ Returns the settings JSON of the tenant_properties context processor
+        for the current tenant and language.
+
+        The response has a strong ETag and is cacheable for
+        TENANT_SETTINGS_MAX_AGE seconds, reference it with the
+        'settings_version' from the context to pick up changes. The language
+        comes from the cookie or Accept-Language header, so the response
+        varies on both.
+    """
+    tenant_settings = get_tenant_settings(request)
+    if tenant_settings is None:
+        raise Http404('No exposed tenant properties')
+
+    etag = quote_etag(tenant_settings.version())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(tenant_settings.json(),
+                                content_type='application/json')
+
+    response['ETag'] = etag
+    patch_cache_control(
+        response, public=True,
+        max_age=getattr(settings, 'TENANT_SETTINGS_MAX_AGE', 60 * 60 * 24 * 365)
+    )
+    patch_vary_headers(response, ('Accept-Language', 'Cookie'))
+    return response